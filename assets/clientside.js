@@ -0,0 +1,52 @@
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    nfhs: {
+        // district maps: base figure per scope (geojson by url) + KPI values
+        district_maps: function (base, values) {
+            const no_update = window.dash_clientside.no_update;
+            if (!base || !values || base.scope !== values.scope) {
+                return [no_update, no_update];
+            }
+            return [values.z, values.z_r2].map(function (z) {
+                const fig = JSON.parse(JSON.stringify(base.figure));
+                fig.data[0].z = z;
+                Object.assign(fig.layout.coloraxis, {
+                    cmin: values.range[0],
+                    cmax: values.range[1],
+                    colorscale: values.colorscale,
+                });
+                return fig;
+            });
+        },
+        // equity bars: state cube (all disaggregations) + selected disaggregation
+        equity_bars: function (data, disagg, base) {
+            const no_update = window.dash_clientside.no_update;
+            if (!data || !disagg) {
+                return [no_update, no_update];
+            }
+            const columns = base.disaggregations[disagg];
+            return base.rounds.map(function (round, i) {
+                const round_data = data.rounds[round];
+                const traces = !round_data ? [] : columns.map(function (col, j) {
+                    return {
+                        type: "bar",
+                        name: col,
+                        x: round_data.x,
+                        y: round_data.y[col],
+                        marker: {color: base.colorway[j % base.colorway.length]},
+                        legendgroup: col,
+                        offsetgroup: col,
+                        alignmentgroup: "True",
+                        orientation: "v",
+                        showlegend: true,
+                        textposition: "auto",
+                        hovertemplate: "variable=" + col +
+                            "<br>Indicator=%{x}<br>value=%{y}<extra></extra>",
+                    };
+                });
+                const layout = JSON.parse(JSON.stringify(base.layouts[i]));
+                layout.template = base.template;
+                return {data: traces, layout: layout};
+            });
+        },
+    },
+});
@@ -1,237 +1,1044 @@
 # %%
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from collections import OrderedDict
 from dash import Dash, dcc, html
 import dash_bootstrap_components as dbc
-from dash.dependencies import Input, Output
+from dash.dependencies import ClientsideFunction, Input, Output, State
 from difflib import get_close_matches
+import flask
+import functools
 from geojson_rewind import rewind
+import gzip
+import hashlib
+import io
 import json
+import multiprocessing as mp
 import numpy as np
+import orjson
+import os
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
+import plotly.io as pio
+import pyarrow as pa
 import requests
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import quote
+
+# command line: python dash_nfhs.py [build-snapshot | bench-geo | warmup]
+cli_command = sys.argv[1] if __name__ == "__main__" and len(sys.argv) > 1 else None
 
 # %%
-# read source data
-file_urls = [
-    "https://github.com/beto-Sibileau/ico-nhfs-dash/raw/main/NFHS_data/NFHS345.xlsx",
-    "https://github.com/beto-Sibileau/ico-nhfs-dash/raw/main/NFHS_data/NFHS45%20CoC%20and%20Child%20Nutrition.xlsx",
-    "https://github.com/beto-Sibileau/ico-nhfs-dash/raw/main/NFHS_data/NFHS-%205%20compiled%20factsheet%20for%20INDIA.xlsx",
-    "https://github.com/beto-Sibileau/ico-nhfs-dash/raw/main/NFHS_data/Equity%20Analysis.xlsx",
-]
-df_list = [
-    pd.read_excel(url, sheet_name=0, dtype=str)
-    if "Equity" not in url
-    else pd.read_excel(url, sheet_name=None, dtype=str, header=2)
-    for url in file_urls
-]
+# read source data: paths relative to the repo, resolved by data source backends
+nfhs_sources = {
+    "nfhs_345": "NFHS_data/NFHS345.xlsx",
+    "coc_nutrition": "NFHS_data/NFHS45 CoC and Child Nutrition.xlsx",
+    "india_factsheet": "NFHS_data/NFHS- 5 compiled factsheet for INDIA.xlsx",
+    "equity": "NFHS_data/Equity Analysis.xlsx",
+    # geojson all
+    "geo": "shapefiles/India_707_districts_with_J&K_Adjustment.json",
+}
+
+# repo folder: local copies of source data and snapshot location
+base_dir = os.path.dirname(os.path.abspath(__file__))
+
+# NFHS_DATA_SOURCE: backends tried in order, any of "local", "cache", "remote"
+data_source_backends = os.environ.get("NFHS_DATA_SOURCE", "local,cache").split(",")
+local_data_dir = os.environ.get("NFHS_DATA_DIR", base_dir)
+http_cache_dir = os.environ.get("NFHS_CACHE_DIR", os.path.join(base_dir, "NFHS_cache"))
+remote_base_url = os.environ.get(
+    "NFHS_REMOTE_URL", "https://github.com/beto-Sibileau/ico-nhfs-dash/raw/main/"
+)
+http_timeout = 30
+
+
+def source_url(path):
+    return remote_base_url + quote(path)
+
+
+def write_atomic(path, content):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def read_local(path):
+    local_path = os.path.join(local_data_dir, path)
+    if not os.path.isfile(local_path):
+        return None
+    with open(local_path, "rb") as f:
+        return f.read()
+
+
+def http_cache_path(path):
+    return os.path.join(http_cache_dir, hashlib.sha256(path.encode()).hexdigest())
+
+
+def read_cached_copy(path):
+    # cached bytes as stored, no network revalidation
+    cache_path = http_cache_path(path)
+    if not (os.path.isfile(f"{cache_path}.meta") and os.path.isfile(cache_path)):
+        return None
+    with open(cache_path, "rb") as f:
+        return f.read()
+
+
+def read_cached(path):
+    # on-disk http cache: revalidate with ETag/Last-Modified, serve stale offline
+    cache_path = http_cache_path(path)
+    cached_meta = {}
+    if os.path.isfile(f"{cache_path}.meta") and os.path.isfile(cache_path):
+        with open(f"{cache_path}.meta", "rb") as f:
+            cached_meta = orjson.loads(f.read())
+
+    headers = {}
+    if cached_meta.get("etag"):
+        headers["If-None-Match"] = cached_meta["etag"]
+    if cached_meta.get("last_modified"):
+        headers["If-Modified-Since"] = cached_meta["last_modified"]
+    try:
+        response = requests.get(source_url(path), headers=headers, timeout=http_timeout)
+    except requests.RequestException as e:
+        print(f"Source {path} not validated ({e}): using cached copy")
+        response = None
+
+    if response is not None and response.status_code == 200:
+        os.makedirs(http_cache_dir, exist_ok=True)
+        write_atomic(cache_path, response.content)
+        meta = {
+            "url": response.url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+        write_atomic(f"{cache_path}.meta", orjson.dumps(meta))
+        return response.content
+    if response is not None and response.status_code != 304:
+        print(f"Source {path} returned HTTP {response.status_code}")
+    if not cached_meta:
+        return None
+    with open(cache_path, "rb") as f:
+        return f.read()
+
+
+def read_remote(path):
+    response = requests.get(source_url(path), timeout=http_timeout)
+    response.raise_for_status()
+    return response.content
+
+
+data_source_readers = {
+    "local": read_local,
+    "cache": read_cached,
+    "remote": read_remote,
+}
+
+# readers that never touch the network, to validate an existing snapshot
+offline_source_readers = {
+    "local": read_local,
+    "cache": read_cached_copy,
+}
+
+
+def read_source(name, revalidate=True):
+    path = nfhs_sources[name]
+    readers = data_source_readers if revalidate else offline_source_readers
+    for backend in data_source_backends:
+        if backend.strip() not in readers:
+            continue
+        content = readers[backend.strip()](path)
+        if content is not None:
+            return content
+    raise FileNotFoundError(
+        f"Source {path} not found in backends {data_source_backends}"
+    )
+
+
+def read_workbook(content, name):
+    if name != "equity":
+        return pd.read_excel(io.BytesIO(content), sheet_name=0, dtype=str)
+    return pd.read_excel(io.BytesIO(content), sheet_name=None, dtype=str, header=2)
+
+
+def read_geojson(content):
+    json_read = orjson.loads(content)
+    return rewind(json_read, rfc7946=False)
+
 
 # %%
 # compiled india xls: transform column names
-df_list[2].rename(
-    columns={
-        "Sl.No": "No.",
-        "NFHS-5 (2019-21)": "Urban",
-        "Unnamed: 4": "Rural",
-        "Unnamed: 5": "Total",
-        "Unnamed: 7": "Indicator Type",
-        "Unnamed: 8": "Gender",
-        "Unnamed: 9": "NFHS",
-        "Unnamed: 10": "Year (give as a period)",
-    },
-    inplace=True,
-)
+def clean_india_factsheet(df_india):
+    df_india = df_india.rename(
+        columns={
+            "Sl.No": "No.",
+            "NFHS-5 (2019-21)": "Urban",
+            "Unnamed: 4": "Rural",
+            "Unnamed: 5": "Total",
+            "Unnamed: 7": "Indicator Type",
+            "Unnamed: 8": "Gender",
+            "Unnamed: 9": "NFHS",
+            "Unnamed: 10": "Year (give as a period)",
+        },
+    )
+
+    # add India as state column
+    df_india["State"] = "India"
+    # drop first row
+    return df_india.drop(0)
 
-# add India as state column
-df_list[2]["State"] = "India"
-# drop first row
-df_list[2].drop(0, inplace=True)
 
 # %%
 # equity xls: concat excel sheets per added indicator
-df_list_equity = []
-for name in list(df_list[3].keys())[:6]:
-    df_list[3][name]["Indicator"] = name
-    df_list_equity.append(
-        df_list[3][name]
-        .rename(
-            columns={
-                "Unnamed: 0": "State",
-                "Unnamed: 1": "Total",
+def clean_equity(equity_sheets):
+    df_list_equity = []
+    for name in list(equity_sheets.keys())[:6]:
+        equity_sheets[name]["Indicator"] = name
+        df_list_equity.append(
+            equity_sheets[name]
+            .rename(
+                columns={
+                    "Unnamed: 0": "State",
+                    "Unnamed: 1": "Total",
+                }
+            )
+            .dropna(subset=["State", "Year"])
+        )
+
+    return (
+        pd.concat(df_list_equity, ignore_index=True)
+        .replace(
+            {
+                "Indicator": {
+                    "Protected against neonatTetnus ": "Neonatal Protection"
+                },
+                "Year": {
+                    "2015-16": "NFHS-4 (2015-16)",
+                    "2019-21": "NFHS-5 (2019-21)",
+                    "2019-2021": "NFHS-5 (2019-21)",
+                },
+                "State": {
+                    "India": "All India",
+                    "Jammu And Kashmir": "Jammu and Kashmir",
+                    "Andaman And Nicobar Islands": "Andaman and Nicobar Islands",
+                    "Andaman & Nicobar Isl": "Andaman and Nicobar Islands",
+                    "Dadra & Nagar Haveli": "Dadra and Nagar Haveli",
+                    "Delhi": "Nct of Delhi",
+                    "Nct Of Delhi": "Nct of Delhi",
+                },
+            }
+        )
+        .astype(
+            {
+                "Total": "float64",
+                "Rural": "float64",
+                "Urban": "float64",
+                "Poorest": "float64",
+                "Poor": "float64",
+                "Middle": "float64",
+                "Rich": "float64",
+                "Richest": "float64",
+                "No education": "float64",
+                "Primary education": "float64",
+                "Secondary education": "float64",
+                "Higher education": "float64",
+                "SC": "float64",
+                "ST": "float64",
+                "OBC": "float64",
+                "Others": "float64",
+                "Hindu": "float64",
+                "Muslim": "float64",
+                "Other": "float64",
             }
         )
-        .dropna(subset=["State", "Year"])
     )
 
-df_equity = (
-    pd.concat(df_list_equity, ignore_index=True)
-    .replace(
-        {
-            "Indicator": {"Protected against neonatTetnus ": "Neonatal Protection"},
-            "Year": {
-                "2015-16": "NFHS-4 (2015-16)",
-                "2019-21": "NFHS-5 (2019-21)",
-                "2019-2021": "NFHS-5 (2019-21)",
-            },
-            "State": {
-                "India": "All India",
-                "Jammu And Kashmir": "Jammu and Kashmir",
-                "Andaman And Nicobar Islands": "Andaman and Nicobar Islands",
-                "Andaman & Nicobar Isl": "Andaman and Nicobar Islands",
-                "Dadra & Nagar Haveli": "Dadra and Nagar Haveli",
-                "Delhi": "Nct of Delhi",
-                "Nct Of Delhi": "Nct of Delhi",
-            },
-        }
+
+# %%
+# state/district crosswalk: data names to GEO names, persisted between builds
+crosswalk_path = os.environ.get(
+    "NFHS_CROSSWALK", os.path.join(base_dir, "district_crosswalk.csv")
+)
+# bump when matching rules or manual overrides change
+crosswalk_version = 2
+crosswalk_columns = ["State", "District name", "State_geo", "District_geo", "source"]
+
+# manual adjust after inspection
+manual_state_geo = {
+    "D & D": " Daman and Diu",
+    "D & DNH": " Dadra and Nagar Haveli",
+}
+# manual adjust after inspection (also double assigned ones)
+manual_district_geo = {
+    "D & DNH": "Dadra & Nagar Haveli",
+    "East Godavari": "East Godavari",
+    "Uttara Kannada": "Uttara Kannada",
+    "East Khasi Hills": "East Khasi Hills",
+    "East Garo Hills": "East Garo Hills",
+    "Imphal East": "Imphal East",
+    "East District": "East District",
+    "Ranga Reddy": "Ranga Reddy",
+    "East Kameng": "East Kameng",
+    "East Siang": "East Siang",
+    "East": "East",
+    "North East": "North East",
+    "South East": "South East",
+}
+
+
+def closest_geo_name(name, geo_names, cutoff=0.5):
+    # difflib scores every candidate of the scope, as the original matching did
+    match = get_close_matches(name.lower(), geo_names, n=1, cutoff=cutoff)
+    return match[0] if match else np.nan
+
+
+def read_crosswalk():
+    if not os.path.isfile(crosswalk_path):
+        return pd.DataFrame(columns=crosswalk_columns + ["version"])
+    crosswalk_df = pd.read_csv(
+        crosswalk_path, dtype=str, keep_default_na=False, na_values=[""]
     )
-    .astype(
+    if (crosswalk_df.version != str(crosswalk_version)).any():
+        print(f"Crosswalk {crosswalk_path} version changed: matching again")
+        return pd.DataFrame(columns=crosswalk_columns + ["version"])
+    return crosswalk_df
+
+
+def update_crosswalk(data_st_dt_df, ds_df):
+    crosswalk_df = read_crosswalk()
+    known_pairs = {
+        (row[0], row[1]): row[3]
+        for row in crosswalk_df[crosswalk_columns].itertuples(index=False)
+        if row.source == "fuzzy" and isinstance(row.District_geo, str)
+    }
+    known_states = {
+        state: state_geo
+        for state, state_geo in zip(crosswalk_df.State, crosswalk_df.State_geo)
+        if isinstance(state_geo, str)
+    }
+    geo_states = ds_df.State.dropna().unique()
+    geo_district_names = {}
+
+    rows = []
+    for state, district in data_st_dt_df[["State", "District name"]].itertuples(
+        index=False
+    ):
+        # new or unmatched names only: fuzzy match against GEO names
+        if state in manual_state_geo:
+            known_states[state] = manual_state_geo[state]
+        elif state not in known_states:
+            known_states[state] = closest_geo_name(state, geo_states)
+        matched_state = known_states[state]
+
+        if district in manual_district_geo:
+            district_geo, source = manual_district_geo[district], "manual"
+        elif (state, district) in known_pairs:
+            district_geo, source = known_pairs[(state, district)], "fuzzy"
+        else:
+            if matched_state not in geo_district_names:
+                geo_district_names[matched_state] = ds_df[
+                    ds_df.State == matched_state
+                ].Dist.values
+            district_geo = closest_geo_name(district, geo_district_names[matched_state])
+            source = "fuzzy"
+        rows.append((state, district, matched_state, district_geo, source))
+
+    new_crosswalk_df = pd.DataFrame(rows, columns=crosswalk_columns)
+    new_crosswalk_df["version"] = str(crosswalk_version)
+    if not new_crosswalk_df.equals(crosswalk_df):
+        new_crosswalk_df.to_csv(crosswalk_path, index=False, na_rep="")
+    return new_crosswalk_df
+
+
+# %%
+# auto match data and GEO states and districts
+def match_geo_names(df_district, geo_json_dict):
+
+    # district naming
+    district_list = [
+        dist_name["properties"]["707_dist_7"]
+        for dist_name in geo_json_dict["features"]
+    ]
+    district_series = pd.Series(district_list)
+    ds_df = pd.DataFrame(
         {
-            "Total": "float64",
-            "Rural": "float64",
-            "Urban": "float64",
-            "Poorest": "float64",
-            "Poor": "float64",
-            "Middle": "float64",
-            "Rich": "float64",
-            "Richest": "float64",
-            "No education": "float64",
-            "Primary education": "float64",
-            "Secondary education": "float64",
-            "Higher education": "float64",
-            "SC": "float64",
-            "ST": "float64",
-            "OBC": "float64",
-            "Others": "float64",
-            "Hindu": "float64",
-            "Muslim": "float64",
-            "Other": "float64",
+            "Dist": district_series.str.split(",").str[0],
+            "State": district_series.str.split(",").str[1],
         }
     )
-)
 
-# names to display in dropdown equity
-states_4_equity = df_equity.State.unique()
+    data_st_dt_df = df_district.groupby(
+        ["State", "District name"], sort=False, as_index=False
+    ).size()
+    crosswalk_df = update_crosswalk(data_st_dt_df, ds_df)
+    print(
+        "Ask RAKESH about PRESENCE of District TUE in NAGALAND - NOTE also TUENSANG appears"
+    )
+
+    state_geo_df = crosswalk_df.drop_duplicates("State")[
+        ["State", "State_geo"]
+    ].reset_index(drop=True)
+
+    state_district_geo_df = crosswalk_df[
+        ["District name", "District_geo", "State", "State_geo"]
+    ].copy()
+    # re-name for geojson: join Distric and Stae geo's
+    state_district_geo_df.loc[:, "District_geo"] = (
+        state_district_geo_df[["District_geo", "State_geo"]]
+        .fillna("N/A")
+        .agg(",".join, axis=1)
+    )
+    # drop state_geo after join no longer needed
+    state_district_geo_df.drop(columns="State_geo", inplace=True)
+
+    return state_geo_df, state_district_geo_df
 
-# %%
-# geojson all
-json_file_url = "https://github.com/beto-Sibileau/ico-nhfs-dash/raw/main/shapefiles/India_707_districts_with_J%26K_Adjustment.json"
-response_geo = requests.get(json_file_url)
-json_read = response_geo.json()
-geo_json_dict = rewind(json_read, rfc7946=False)
 
 # %%
-# district naming
-district_list = [
-    dist_name["properties"]["707_dist_7"] for dist_name in geo_json_dict["features"]
+# df for district map with added column for geo_json
+district_category_columns = [
+    "State",
+    "District name",
+    "Round",
+    "year",
+    "variable",
+    "District_geo",
 ]
-district_series = pd.Series(district_list)
-ds_df = pd.DataFrame(
-    {
-        "Dist": district_series.str.split(",").str[0],
-        "State": district_series.str.split(",").str[1],
+
+
+def melt_district_map(df_district, state_district_geo_df):
+    district_map_df = df_district.melt(
+        id_vars=["State", "District name", "Round", "year"]
+    ).merge(
+        state_district_geo_df,
+        on=["State", "District name"],
+        how="left",
+        sort=False,
+    )
+
+    filter_na = district_map_df.value.isnull()
+    filter_non_num = pd.to_numeric(district_map_df.value, errors="coerce").isnull()
+    # negatives detected
+    print("Ask RAKESH about PRESENCE of NON-NUMERICS")
+    print(district_map_df[filter_non_num & ~filter_na].values[0])
+    # drop non-num
+    district_map_df = (
+        district_map_df.drop(district_map_df[filter_non_num & ~filter_na].index)
+        .astype({"value": "float64"})
+        .reset_index(drop=True)
+    )
+
+    filter_negative = district_map_df.value < 0
+    # negatives detected
+    print("Ask RAKESH about PRESENCE of NEGATIVES")
+    print(district_map_df[filter_negative].values[0])
+    # drop negatives
+    district_map_df = district_map_df.drop(district_map_df[filter_negative].index)
+
+    # contiguous rows per (variable, Round, State): see district_partitions
+    district_map_df = district_map_df.sort_values(
+        ["variable", "Round", "State"], kind="stable", ignore_index=True
+    )
+
+    # compact storage: dictionary-encoded names; values stay float64 so the
+    # reported decimals are kept exactly
+    memory_before = district_map_df.memory_usage(deep=True).sum()
+    district_map_df = district_map_df.astype(
+        {
+            **{col: "category" for col in district_category_columns},
+            "value": "float64",
+        }
+    )
+    memory_after = district_map_df.memory_usage(deep=True).sum()
+    print(
+        f"district_map_df memory: {memory_before / 2**20:.1f} MiB -> "
+        f"{memory_after / 2**20:.1f} MiB"
+    )
+    return district_map_df
+
+
+# scatter matrices per round: districts (sorted by state) x KPIs, column-major so
+# a KPI over a state's row block is a view; present marks reported values
+def build_district_wide(district_map_df, nfhs_round):
+    round_df = district_map_df[district_map_df.Round == nfhs_round]
+    district_keys = round_df[["State", "District name"]].astype(object)
+    districts = district_keys.drop_duplicates().sort_values(
+        ["State", "District name"], ignore_index=True
+    )
+    kpis = district_map_df.variable.cat.categories
+    row_pos = pd.MultiIndex.from_frame(districts).get_indexer(
+        pd.MultiIndex.from_frame(district_keys)
+    )
+    col_pos = round_df.variable.cat.codes.values
+    values = np.full((len(districts), len(kpis)), np.nan, order="F")
+    present = np.zeros((len(districts), len(kpis)), dtype=bool, order="F")
+    values[row_pos, col_pos] = round_df.value.values
+    present[row_pos, col_pos] = True
+    states = districts.State.values
+    starts = np.flatnonzero(np.append(True, states[1:] != states[:-1]))
+    stops = np.append(starts[1:], len(states))
+    return {
+        "districts": districts,
+        "values": values,
+        "present": present,
+        "kpi_columns": {kpi: col for col, kpi in enumerate(kpis)},
+        "state_rows": dict(zip(states[starts], zip(starts, stops))),
     }
-)
+
+
+# related indicators: pairwise pearson r between KPIs, NaN-aware per KPI pair
+def pairwise_correlations(values):
+    valid = (~np.isnan(values)).astype("float64")
+    x = np.where(np.isnan(values), 0.0, values)
+    # [i, j] sums run over the districts reporting both KPI i and KPI j
+    n = valid.T @ valid
+    sum_x = x.T @ valid
+    sum_xx = (x * x).T @ valid
+    sum_xy = x.T @ x
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = sum_xy - sum_x * sum_x.T / n
+        var = sum_xx - sum_x**2 / n
+        r = cov / np.sqrt(var * var.T)
+    return np.clip(r, -1, 1), n
+
+
+def build_kpi_correlations(district_map_df):
+    # per round and scope (All India, states): one row per related KPI pair,
+    # sorted by R^2 within each (Scope, Round, variable)
+    kpis = district_map_df.variable.cat.categories
+    tables = []
+    for nfhs_round in ["NFHS-4", "NFHS-5"]:
+        wide = build_district_wide(district_map_df, nfhs_round)
+        scope_rows = {"All India": (0, len(wide["districts"])), **wide["state_rows"]}
+        for scope, (start, stop) in scope_rows.items():
+            r, n = pairwise_correlations(wide["values"][start:stop])
+            # at least 3 districts reporting both, no self pairs
+            i, j = np.nonzero((n >= 3) & ~np.isnan(r) & ~np.eye(len(kpis), dtype=bool))
+            tables.append(
+                pd.DataFrame(
+                    {
+                        "Scope": scope,
+                        "Round": nfhs_round,
+                        "variable": kpis[i],
+                        "related": kpis[j],
+                        "r": r[i, j],
+                        "r_sq": r[i, j] ** 2,
+                        "districts": n[i, j].astype("int32"),
+                    }
+                )
+            )
+    kpi_correlations = pd.concat(tables, ignore_index=True)
+    kpi_correlations = kpi_correlations.sort_values(
+        ["Scope", "Round", "variable", "r_sq"],
+        ascending=[True, True, True, False],
+        kind="stable",
+        ignore_index=True,
+    )
+    return kpi_correlations.astype(
+        {col: "category" for col in ["Scope", "Round", "variable", "related"]}
+    )
+
 
 # %%
-# auto match data and GEO states
-data_st_dt_df = (
-    df_list[1].groupby(["State", "District name"], sort=False, as_index=False).size()
-)
-data_states = data_st_dt_df.State.unique()
-geo_states = ds_df.State.dropna().unique()
+# filter gender indicators for trend analysis
+def clean_nfhs_345(df_345, df_india):
+    df_nfhs_345 = (
+        pd.concat(
+            [
+                df_345,
+                df_india[
+                    [
+                        "Indicator",
+                        "NFHS-4 (2015-16)",
+                        "Indicator Type",
+                        "Gender",
+                        "State",
+                    ]
+                ].rename(columns={"NFHS-4 (2015-16)": "Total"}),
+                df_india.drop(columns="NFHS-4 (2015-16)"),
+            ],
+            ignore_index=True,
+        )
+        .fillna({"NFHS": "NFHS 4", "Year (give as a period)": "2016"})
+        .query("Gender.isnull()", engine="python")
+        .reset_index(drop=True)
+        .replace({"State": {"INDIA": "India"}})
+        .replace({"State": {"India": "All India"}})
+    )
 
-state_match = [
-    get_close_matches(st.lower(), geo_states, n=1, cutoff=0.5) for st in data_states
-]
-state_geo_df = pd.DataFrame(
-    {"State": data_states, "State_geo": [st[0] if st else np.nan for st in state_match]}
-)
+    # filter uncleaned data in numerical columns
+    num_cols = ["Urban", "Rural", "Total"]
+    for col in num_cols:
+        filter_na_345 = df_nfhs_345[col].isnull()
+        filter_non_num_345 = pd.to_numeric(df_nfhs_345[col], errors="coerce").isnull()
+        # non numerics
+        print("Ask RAKESH about PRESENCE of NON-NUMERICS")
+        print(df_nfhs_345[filter_non_num_345 & ~filter_na_345][col].values[0])
+        # drop non-num
+        df_nfhs_345 = (
+            df_nfhs_345.drop(df_nfhs_345[filter_non_num_345 & ~filter_na_345].index)
+            .astype({col: "float64"})
+            .reset_index(drop=True)
+        )
+
+        # negatives detected
+        filter_neg_345 = df_nfhs_345[col] < 0
+        print("Ask RAKESH about PRESENCE of NEGATIVES")
+        print(
+            f"No negatives for df column {col}"
+            if df_nfhs_345[filter_neg_345].empty
+            else df_nfhs_345[filter_neg_345].values[0]
+        )
+        # drop negatives
+        df_nfhs_345 = df_nfhs_345.drop(df_nfhs_345[filter_neg_345].index).reset_index(
+            drop=True
+        )
+
+    return df_nfhs_345
 
-# manual adjust after inspection
-state_geo_df.loc[state_geo_df.State == "D & D", "State_geo"] = " Daman and Diu"
-state_geo_df.loc[
-    state_geo_df.State == "D & DNH", "State_geo"
-] = " Dadra and Nagar Haveli"
 
 # %%
-# auto match data and GEO districts
-district_geo_df_list = []
-for state in data_states:
+# concurrent ingestion: fetch all sources, then parse/clean them in parallel
+# NFHS_INGEST_POOL: "process" (default), "thread" or "serial"
+ingest_pool = os.environ.get("NFHS_INGEST_POOL", "process")
+# seconds per source and stage, printed as ingestion report
+ingest_timings = {}
+
+
+def fetch_source(name, revalidate=True):
+    start = time.perf_counter()
+    try:
+        content = read_source(name, revalidate)
+    except (OSError, requests.RequestException) as e:
+        print(f"Source {name} unavailable: {e}")
+        content = None
+    return content, time.perf_counter() - start
+
+
+def parse_source(name, content):
+    # independent steps per source: parse, clean and rewind geometry
+    start = time.perf_counter()
+    if name == "geo":
+        parsed = read_geojson(content)
+    elif name == "equity":
+        parsed = clean_equity(read_workbook(content, name))
+    elif name == "india_factsheet":
+        parsed = clean_india_factsheet(read_workbook(content, name))
+    else:
+        parsed = read_workbook(content, name)
+    return parsed, time.perf_counter() - start
+
+
+def fork_call(func, args):
+    # forked child runs func as inherited: nothing is pickled but the result
+    reader, writer = mp.Pipe(duplex=False)
+
+    def child():
+        try:
+            writer.send((True, func(*args)))
+        except Exception as error:
+            writer.send((False, error))
+
+    process = mp.get_context("fork").Process(target=child)
+    process.start()
+    writer.close()
+    return process, reader
+
+
+def run_concurrently(func, args_list, pool_kind):
+    if pool_kind == "serial":
+        return [func(*args) for args in args_list]
+    if pool_kind == "process" and "fork" in mp.get_all_start_methods():
+        # not a process pool: its feeder thread pickles func by module name and
+        # deadlocks on the import lock while this module is being imported
+        calls = [fork_call(func, args) for args in args_list]
+        results = []
+        for process, reader in calls:
+            ok, result = reader.recv()
+            process.join()
+            if not ok:
+                raise result
+            results.append(result)
+        return results
+    with ThreadPoolExecutor(max_workers=len(args_list)) as executor:
+        futures = [executor.submit(func, *args) for args in args_list]
+        return [future.result() for future in futures]
+
+
+def fetch_sources(revalidate=True):
+    # source bytes, None when no backend can provide them (io bound: threads)
+    results = run_concurrently(
+        fetch_source, [(name, revalidate) for name in nfhs_sources], "thread"
+    )
+    contents = {}
+    for name, (content, seconds) in zip(nfhs_sources, results):
+        contents[name] = content
+        ingest_timings.setdefault(name, {})["fetch"] = seconds
+    return contents
+
+
+def parse_sources(contents):
+    results = run_concurrently(
+        parse_source, [(name, contents[name]) for name in nfhs_sources], ingest_pool
+    )
+    parsed = {}
+    for name, (source_parsed, seconds) in zip(nfhs_sources, results):
+        parsed[name] = source_parsed
+        ingest_timings.setdefault(name, {})["parse"] = seconds
+    return parsed
+
+
+def print_ingest_report(wall_seconds):
+    print("NFHS ingestion report (seconds):")
+    for name, timing in ingest_timings.items():
+        stages = "  ".join(f"{stage} {sec:6.2f}" for stage, sec in timing.items())
+        print(f"  {name:<16} {stages}")
+    print(f"  {'wall':<16} {wall_seconds:6.2f}")
+
+
+# %%
+# geometry levels of detail: decimals kept after quantization and simplification
+# tolerance in degrees; "high" is the source geometry
+geo_levels = {
+    "high": None,
+    "medium": {"decimals": 4, "tolerance": 0.001},
+    "low": {"decimals": 3, "tolerance": 0.01},
+}
 
-    data_districts = data_st_dt_df[data_st_dt_df.State == state]["District name"]
-    matched_state = state_geo_df[state_geo_df.State == state].State_geo.values[0]
-    geo_districts = ds_df[ds_df.State == matched_state].Dist
 
-    district_match = [
-        get_close_matches(dt.lower(), geo_districts, n=1, cutoff=0.5)
-        for dt in data_districts
+def douglas_peucker(points, tolerance):
+    keep = np.zeros(len(points), dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, stop = stack.pop()
+        if stop <= start + 1:
+            continue
+        segment = points[stop] - points[start]
+        rel = points[start + 1 : stop] - points[start]
+        segment_len = np.hypot(*segment)
+        if segment_len == 0:
+            dist = np.hypot(rel[:, 0], rel[:, 1])
+        else:
+            dist = np.abs(segment[0] * rel[:, 1] - segment[1] * rel[:, 0]) / segment_len
+        farthest = int(np.argmax(dist))
+        if dist[farthest] > tolerance:
+            split = start + 1 + farthest
+            keep[split] = True
+            stack.extend([(start, split), (split, stop)])
+    return points[keep]
+
+
+def quantize_ring(ring, decimals):
+    snapped = np.round(np.asarray(ring, dtype=float)[:, :2], decimals)
+    # drop repeated points after snapping
+    moved = np.ones(len(snapped), dtype=bool)
+    moved[1:] = np.any(snapped[1:] != snapped[:-1], axis=1)
+    return [tuple(point) for point in snapped[moved].tolist()]
+
+
+def geometry_polygons(geometry):
+    if geometry["type"] == "Polygon":
+        return [geometry["coordinates"]]
+    if geometry["type"] == "MultiPolygon":
+        return geometry["coordinates"]
+    return []
+
+
+def simplify_geojson(geo_json, decimals, tolerance):
+    # topology preserving: rings are cut at junctions (vertices with more than
+    # two neighbours) and every shared arc is simplified once, so neighbouring
+    # districts keep identical borders
+    quantized = [
+        [[quantize_ring(ring, decimals) for ring in polygon] for polygon in polygons]
+        for polygons in (
+            geometry_polygons(feature["geometry"]) for feature in geo_json["features"]
+        )
     ]
-    district_geo_df = pd.DataFrame(
-        {
-            "District name": data_districts,
-            "District_geo": [st[0] if st else np.nan for st in district_match],
-        }
+    neighbours = {}
+    for polygons in quantized:
+        for polygon in polygons:
+            for ring in polygon:
+                for a, b in zip(ring[:-1], ring[1:]):
+                    neighbours.setdefault(a, set()).add(b)
+                    neighbours.setdefault(b, set()).add(a)
+    junctions = {point for point, linked in neighbours.items() if len(linked) > 2}
+
+    simplified_arcs = {}
+
+    def simplify_arc(arc):
+        key = min(arc, arc[::-1])
+        if key not in simplified_arcs:
+            simplified_arcs[key] = [
+                tuple(point)
+                for point in douglas_peucker(np.array(key), tolerance).tolist()
+            ]
+        simplified = simplified_arcs[key]
+        return simplified if key == arc else simplified[::-1]
+
+    def simplify_ring(ring):
+        open_ring = ring[:-1]
+        if len(open_ring) < 3:
+            return ring
+        cuts = [i for i, point in enumerate(open_ring) if point in junctions]
+        # no junction: canonical start so an identical ring elsewhere matches
+        first = cuts[0] if cuts else open_ring.index(min(open_ring))
+        open_ring = open_ring[first:] + open_ring[:first]
+        cuts = [(i - first) % len(open_ring) for i in cuts] or [0]
+        closed = open_ring + open_ring[:1]
+        simplified = []
+        for start, stop in zip(sorted(cuts), sorted(cuts)[1:] + [len(open_ring)]):
+            simplified.extend(simplify_arc(tuple(closed[start : stop + 1]))[:-1])
+        simplified.append(simplified[0])
+        return simplified if len(simplified) >= 4 else ring
+
+    features = []
+    for feature, polygons in zip(geo_json["features"], quantized):
+        simplified = [
+            [[list(point) for point in simplify_ring(ring)] for ring in polygon]
+            for polygon in polygons
+        ]
+        geometry = (
+            {"type": "Polygon", "coordinates": simplified[0]}
+            if feature["geometry"]["type"] == "Polygon"
+            else {"type": "MultiPolygon", "coordinates": simplified}
+        )
+        features.append({**feature, "geometry": geometry})
+    return {**geo_json, "features": features}
+
+
+def simplify_geo_level(geo_json, level):
+    start = time.perf_counter()
+    simplified = simplify_geojson(geo_json, **geo_levels[level])
+    return simplified, time.perf_counter() - start
+
+
+def build_geo_levels(geo_json_dict):
+    # offline step of the build: one simplified geojson per reduced level
+    levels = [level for level, detail in geo_levels.items() if detail]
+    results = run_concurrently(
+        simplify_geo_level, [(geo_json_dict, level) for level in levels], ingest_pool
     )
-    district_geo_df["State"] = state
-    district_geo_df["State_geo"] = matched_state
-    district_geo_df_list.append(district_geo_df)
+    geo_json_levels = {}
+    for level, (simplified, seconds) in zip(levels, results):
+        geo_json_levels[f"geo_json_{level}"] = simplified
+        ingest_timings[f"geo_{level}"] = {"simplify": seconds}
+    return geo_json_levels
 
-state_district_geo_df = pd.concat(district_geo_df_list, ignore_index=True)
 
-# manual adjust after inspection
-state_district_geo_df.loc[
-    state_district_geo_df["District name"] == "D & DNH", "District_geo"
-] = "Dadra & Nagar Haveli"
-print(
-    "Ask RAKESH about PRESENCE of District TUE in NAGALAND - NOTE also TUENSANG appears"
+# %%
+# full excel pipeline: clean parsed sources
+def build_nfhs_frames(contents):
+    parsed = parse_sources(contents)
+    df_district = parsed["coc_nutrition"]
+    geo_json_dict = parsed["geo"]
+    start = time.perf_counter()
+    state_geo_df, state_district_geo_df = match_geo_names(df_district, geo_json_dict)
+    district_map_df = melt_district_map(df_district, state_district_geo_df)
+    frames = {
+        "df_equity": parsed["equity"],
+        "state_geo_df": state_geo_df,
+        "state_district_geo_df": state_district_geo_df,
+        "district_map_df": district_map_df,
+        "kpi_correlations": build_kpi_correlations(district_map_df),
+        "df_nfhs_345": clean_nfhs_345(parsed["nfhs_345"], parsed["india_factsheet"]),
+        # district map indicators list
+        "district_kpis": pd.DataFrame({"variable": df_district.columns[4:]}),
+        "geo_json_dict": geo_json_dict,
+    }
+    ingest_timings["clean"] = {"clean": time.perf_counter() - start}
+    frames.update(build_geo_levels(geo_json_dict))
+    return frames
+
+
+# %%
+# data snapshot: cleaned frames as parquet, geojson as json
+# NFHS_SNAPSHOT: "auto" (load, rebuild if missing/stale), "rebuild" or "off"
+snapshot_mode = (
+    "rebuild"
+    if cli_command == "build-snapshot"
+    else os.environ.get("NFHS_SNAPSHOT", "auto")
 )
+snapshot_dir = os.environ.get(
+    "NFHS_SNAPSHOT_DIR", os.path.join(base_dir, "NFHS_snapshot")
+)
+# bump when cleaning steps or stored tables change
+snapshot_version = 6
+snapshot_tables = [
+    "df_equity",
+    "state_geo_df",
+    "state_district_geo_df",
+    "district_map_df",
+    "df_nfhs_345",
+    "district_kpis",
+    "kpi_correlations",
+]
+snapshot_blobs = ["geo_json_dict"] + [
+    f"geo_json_{level}" for level, detail in geo_levels.items() if detail
+]
+
 
-# manual adjust after inspection for double assigned ones
-state_district_geo_df.loc[
-    state_district_geo_df["District name"] == "East Godavari", "District_geo"
-] = "East Godavari"
-state_district_geo_df.loc[
-    state_district_geo_df["District name"] == "Uttara Kannada", "District_geo"
-] = "Uttara Kannada"
-state_district_geo_df.loc[
-    state_district_geo_df["District name"] == "East Khasi Hills", "District_geo"
-] = "East Khasi Hills"
-state_district_geo_df.loc[
-    state_district_geo_df["District name"] == "East Garo Hills", "District_geo"
-] = "East Garo Hills"
-state_district_geo_df.loc[
-    state_district_geo_df["District name"] == "Imphal East", "District_geo"
-] = "Imphal East"
-state_district_geo_df.loc[
-    state_district_geo_df["District name"] == "East District", "District_geo"
-] = "East District"
-state_district_geo_df.loc[
-    state_district_geo_df["District name"] == "Ranga Reddy", "District_geo"
-] = "Ranga Reddy"
-state_district_geo_df.loc[
-    state_district_geo_df["District name"] == "East Kameng", "District_geo"
-] = "East Kameng"
-state_district_geo_df.loc[
-    state_district_geo_df["District name"] == "East Siang", "District_geo"
-] = "East Siang"
-state_district_geo_df.loc[
-    state_district_geo_df["District name"] == "East", "District_geo"
-] = "East"
-state_district_geo_df.loc[
-    state_district_geo_df["District name"] == "North East", "District_geo"
-] = "North East"
-state_district_geo_df.loc[
-    state_district_geo_df["District name"] == "South East", "District_geo"
-] = "South East"
-
-# re-name for geojson: join Distric and Stae geo's
-state_district_geo_df.loc[:, "District_geo"] = (
-    state_district_geo_df[["District_geo", "State_geo"]]
-    .fillna("N/A")
-    .agg(",".join, axis=1)
+def source_checksums(contents):
+    checksums = {
+        name: hashlib.sha256(content).hexdigest() if content is not None else None
+        for name, content in contents.items()
+    }
+    # edits to the crosswalk also invalidate the snapshot
+    crosswalk_content = read_local(crosswalk_path)
+    checksums["crosswalk"] = (
+        hashlib.sha256(crosswalk_content).hexdigest() if crosswalk_content else None
+    )
+    return checksums
+
+
+def write_snapshot(frames, manifest):
+    os.makedirs(snapshot_dir, exist_ok=True)
+    for name in snapshot_tables:
+        write_atomic(
+            os.path.join(snapshot_dir, f"{name}.parquet"), frames[name].to_parquet()
+        )
+    for name in snapshot_blobs:
+        write_atomic(
+            os.path.join(snapshot_dir, f"{name}.json"), orjson.dumps(frames[name])
+        )
+    # manifest last: its presence marks a complete snapshot
+    write_atomic(os.path.join(snapshot_dir, "manifest.json"), orjson.dumps(manifest))
+
+
+def load_snapshot(checksums):
+    # frames and the manifest they were stored with, (None, None) when stale
+    manifest_path = os.path.join(snapshot_dir, "manifest.json")
+    if not os.path.isfile(manifest_path):
+        return None, None
+    with open(manifest_path, "rb") as f:
+        manifest = orjson.loads(f.read())
+    if manifest.get("version") != snapshot_version:
+        print(f"NFHS snapshot version {manifest.get('version')} is stale")
+        return None, None
+    # unavailable sources can't be validated: trust the snapshot for them
+    stored_checksums = manifest.get("sources", {})
+    if any(
+        stored_checksums.get(name) != checksum
+        for name, checksum in checksums.items()
+        if checksum is not None
+    ):
+        print("NFHS snapshot sources changed")
+        return None, None
+
+    frames = {
+        name: pd.read_parquet(os.path.join(snapshot_dir, f"{name}.parquet"))
+        for name in snapshot_tables
+    }
+    for name in snapshot_blobs:
+        with open(os.path.join(snapshot_dir, f"{name}.json"), "rb") as f:
+            frames[name] = orjson.loads(f.read())
+    return frames, manifest
+
+
+# %%
+# load snapshot or fall back to full excel pipeline
+ingest_start = time.perf_counter()
+# an existing snapshot is checked against local/cached bytes only (no network)
+offline_check = snapshot_mode == "auto" and os.path.isfile(
+    os.path.join(snapshot_dir, "manifest.json")
 )
-# drop state_geo after join no longer needed
-state_district_geo_df.drop(columns="State_geo", inplace=True)
+nfhs_contents = fetch_sources(revalidate=not offline_check)
+nfhs_checksums = source_checksums(nfhs_contents)
+nfhs_frames, nfhs_manifest = (
+    load_snapshot(nfhs_checksums) if snapshot_mode == "auto" else (None, None)
+)
+if nfhs_frames is None:
+    if offline_check:
+        # stale snapshot: fetch again, revalidating cached sources
+        nfhs_contents = fetch_sources()
+    missing_sources = [name for name, c in nfhs_contents.items() if c is None]
+    if missing_sources:
+        raise FileNotFoundError(f"No snapshot and missing sources {missing_sources}")
+    nfhs_frames = build_nfhs_frames(nfhs_contents)
+    # crosswalk may have been updated by the build
+    nfhs_manifest = {
+        "version": snapshot_version,
+        "sources": source_checksums(nfhs_contents),
+    }
+    if snapshot_mode != "off":
+        write_snapshot(nfhs_frames, nfhs_manifest)
+print_ingest_report(time.perf_counter() - ingest_start)
+
+# data version: the manifest of the loaded/built frames (snapshot format and
+# stored source checksums), keys shared files/caches
+data_version = hashlib.sha256(
+    orjson.dumps(nfhs_manifest, option=orjson.OPT_SORT_KEYS)
+).hexdigest()[:16]
+
+# %%
+# shared memory: tables as memory-mapped arrow files, so gunicorn workers map
+# the same read-only pages instead of holding a copy each (see gunicorn.conf.py)
+shared_memory = os.environ.get("NFHS_SHARED_MEMORY", "0") == "1"
+shared_memory_dir = os.environ.get(
+    "NFHS_SHM_DIR", "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+)
+
+
+def arrow_column(series):
+    # floats keep NaN as values (no validity bitmap): zero-copy back to numpy
+    if series.dtype.kind == "f":
+        return pa.array(series.values, from_pandas=False)
+    return pa.array(series, from_pandas=True)
+
+
+def share_frame(name, df, shared_key):
+    path = os.path.join(shared_memory_dir, f"nfhs-{shared_key}-{name}.arrow")
+    if not os.path.isfile(path):
+        table = pa.Table.from_arrays(
+            [arrow_column(df[col]) for col in df.columns],
+            names=[str(col) for col in df.columns],
+        )
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with pa.OSFile(tmp_path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+
+    mapped_table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+    # split blocks: numeric columns stay views on the mapped pages
+    return mapped_table.to_pandas(split_blocks=True)
+
+
+def share_frames(frames, shared_key):
+    # files of previous data versions: mapped pages stay valid after unlink
+    for file_name in os.listdir(shared_memory_dir):
+        if file_name.startswith("nfhs-") and not file_name.startswith(
+            f"nfhs-{shared_key}-"
+        ):
+            try:
+                os.remove(os.path.join(shared_memory_dir, file_name))
+            except OSError:
+                pass
+    for name in snapshot_tables:
+        frames[name] = share_frame(name, frames[name], shared_key)
+    return frames
+
+
+if shared_memory:
+    nfhs_frames = share_frames(nfhs_frames, data_version)
+
+# %%
+# cleaned tables
+df_equity = nfhs_frames["df_equity"]
+state_geo_df = nfhs_frames["state_geo_df"]
+state_district_geo_df = nfhs_frames["state_district_geo_df"]
+district_map_df = nfhs_frames["district_map_df"]
+kpi_correlations = nfhs_frames["kpi_correlations"]
+df_nfhs_345 = nfhs_frames["df_nfhs_345"]
+geo_json_dict = nfhs_frames["geo_json_dict"]
+
+# names to display in dropdown equity
+states_4_equity = df_equity.State.unique()
+# data states in order of appearance
+data_states = state_geo_df.State.values
 
 # %%
 # dictionary for plotly: label with no figure
@@ -253,13 +1060,12 @@ label_no_fig = {
 
 # %%
 # all india or states list
-# restricted to States only (All India requires more resources to deploy)
-india_or_state_options = [
+# All India geometry is sent once (see /geo route), KPI changes only send values
+india_or_state_options = [{"label": "All India", "value": "All India"}] + [
     {"label": l, "value": l} for l in sorted(data_states, key=str.lower)
 ]
 
 # dbc select: KPI district map --> All India or States
-# restricted to States only (All India requires more resources to deploy)
 dd_india_or_state = dbc.Select(
     id="india-or-state-dd",
     size="sm",
@@ -269,7 +1075,7 @@ dd_india_or_state = dbc.Select(
 
 # %%
 # district map indicators list
-district_kpi_map = df_list[1].columns[4:].values
+district_kpi_map = nfhs_frames["district_kpis"].variable.values
 district_map_options = [
     {"label": l, "value": l} for l in sorted(district_kpi_map, key=str.lower)
 ]
@@ -425,55 +1231,50 @@ district_map_row = dbc.Container(
             justify="evenly",
             align="center",
         ),
+        # map figures are assembled clientside: base per scope + KPI values
+        dcc.Store(id="district-map-base"),
+        dcc.Store(id="district-map-values"),
     ],
     fluid=True,
 )
 
 # %%
-# df for district map with added column for geo_json
-district_map_df = (
-    df_list[1]
-    .melt(id_vars=["State", "District name", "Round", "year"])
-    .merge(
-        state_district_geo_df,
-        on=["State", "District name"],
-        how="left",
-        sort=False,
-    )
-)
+# geometry store: one pass over features indexed by GEO state, each scope kept
+# as serialized FeatureCollection bytes and served once per version (see /geo)
+# level of detail per scope: states vs. national view
+geo_level_state = os.environ.get("NFHS_GEO_LEVEL_STATE", "medium")
+geo_level_india = os.environ.get("NFHS_GEO_LEVEL_INDIA", "low")
 
-filter_na = district_map_df.value.isnull()
-filter_non_num = pd.to_numeric(district_map_df.value, errors="coerce").isnull()
-# negatives detected
-print("Ask RAKESH about PRESENCE of NON-NUMERICS")
-print(district_map_df[filter_non_num & ~filter_na].values[0])
-# drop non-num
-district_map_df = (
-    district_map_df.drop(district_map_df[filter_non_num & ~filter_na].index)
-    .astype({"value": "float64"})
-    .reset_index(drop=True)
-)
 
-filter_negative = district_map_df.value < 0
-# negatives detected
-print("Ask RAKESH about PRESENCE of NEGATIVES")
-print(district_map_df[filter_negative].values[0])
-# drop negatives
-district_map_df = district_map_df.drop(
-    district_map_df[filter_negative].index
-).reset_index(drop=True)
+def geo_json_level(level):
+    return geo_json_dict if level == "high" else nfhs_frames[f"geo_json_{level}"]
+
+
+def build_geo_store(geo_json):
+    geo_state_features = {}
+    for feature in geo_json["features"]:
+        dist_state = feature["properties"]["707_dist_7"].split(",")
+        if len(dist_state) > 1:
+            geo_state_features.setdefault(dist_state[1], []).append(feature)
+
+    scope_store = {
+        state: orjson.dumps(
+            {
+                "type": "FeatureCollection",
+                "features": geo_state_features.get(state_geo, []),
+            }
+        )
+        for state, state_geo in zip(state_geo_df.State, state_geo_df.State_geo)
+    }
+    return scope_store
 
-# %%
-# filter geojson by state
-geo_dict = {}
-for state in data_states:
-    matched_state = state_geo_df[state_geo_df.State == state].State_geo.values[0]
-    featured_list = [
-        feature
-        for feature in geo_json_dict["features"]
-        if matched_state in feature["properties"]["707_dist_7"]
-    ]
-    geo_dict[state] = featured_list
+
+geo_store = build_geo_store(geo_json_level(geo_level_state))
+geo_store["All India"] = orjson.dumps(geo_json_level(geo_level_india))
+geo_etags = {
+    scope: hashlib.sha256(content).hexdigest()[:16]
+    for scope, content in geo_store.items()
+}
 
 # %%
 # filter available district geo's
@@ -483,6 +1284,111 @@ for state in data_states:
     district_geo_dict[state] = featured_df
 district_geo_dict["All India"] = state_district_geo_df
 
+
+# %%
+# district map index: (State, variable, Round) -> contiguous row slice, with
+# "All India" spanning all states of a (variable, Round)
+def contiguous_ranges(df, keys):
+    # df sorted so that each key combination is a single block of rows
+    block_start = np.zeros(len(df), dtype=bool)
+    block_start[:1] = True
+    for key in keys:
+        codes = df[key].cat.codes.values
+        block_start[1:] |= codes[1:] != codes[:-1]
+    starts = np.flatnonzero(block_start)
+    stops = np.append(starts[1:], len(df))
+    key_values = zip(*[df[key].values[starts] for key in keys])
+    return dict(zip(key_values, zip(starts, stops)))
+
+
+district_partitions = contiguous_ranges(district_map_df, ["State", "variable", "Round"])
+district_partitions.update(
+    {
+        ("All India", variable, nfhs_round): rows
+        for (variable, nfhs_round), rows in contiguous_ranges(
+            district_map_df, ["variable", "Round"]
+        ).items()
+    }
+)
+print(
+    "district_map_df in memory: "
+    f"{district_map_df.memory_usage(deep=True).sum() / 2**20:.1f} MiB"
+)
+
+
+def district_partition(state, kpi, nfhs_round):
+    start, stop = district_partitions.get((state, kpi, nfhs_round), (0, 0))
+    partition_df = district_map_df.iloc[start:stop]
+    # small slice back to plain columns for plotly express
+    return partition_df.astype({col: object for col in district_category_columns})
+
+
+def scope_values(display_df, india_or_state):
+    # values in the order of the scope districts (map base locations): one
+    # reindex, not reported districts as negatives
+    scope_districts = district_geo_dict[india_or_state]
+    values = pd.Series(
+        display_df.value.values,
+        index=pd.MultiIndex.from_frame(display_df[["State", "District name"]]),
+    )
+    values = values[~values.index.duplicated()]
+    return (
+        values.reindex(
+            pd.MultiIndex.from_frame(scope_districts[["State", "District name"]])
+        )
+        .fillna(-1)
+        .values
+    )
+
+
+# %%
+# scatter matrices per round (see build_district_wide)
+district_wide = {
+    nfhs_round: build_district_wide(district_map_df, nfhs_round)
+    for nfhs_round in ["NFHS-4", "NFHS-5"]
+}
+
+
+def district_wide_for(state_values, kpi_list, nfhs_round):
+    # same frame as pivoting the long table on (State, District name)
+    if isinstance(state_values, str):
+        state_values = [state_values]
+    wide = district_wide[nfhs_round]
+    row_blocks = [
+        slice(*wide["state_rows"][state])
+        for state in sorted(set(state_values))
+        if state in wide["state_rows"]
+    ]
+
+    def column(matrix, col):
+        blocks = [matrix[rows, col] for rows in row_blocks] or [matrix[:0, col]]
+        # a single state is a view into the matrix
+        return blocks[0] if len(blocks) == 1 else np.concatenate(blocks)
+
+    display_df = pd.concat(
+        [wide["districts"].iloc[rows] for rows in row_blocks]
+        or [wide["districts"].iloc[:0]]
+    )
+    reported = np.zeros(len(display_df), dtype=bool)
+    for kpi in dict.fromkeys(kpi_list):
+        col = wide["kpi_columns"][kpi]
+        display_df[kpi] = column(wide["values"], col)
+        reported |= column(wide["present"], col)
+    # districts reporting neither KPI in the round are left out
+    return display_df[reported].reset_index(drop=True)
+
+
+# %%
+# related indicators: (Scope, Round, variable) -> rows sorted by R^2
+related_kpi_rows = contiguous_ranges(kpi_correlations, ["Scope", "Round", "variable"])
+related_kpis_top_k = 10
+
+
+def related_kpis(india_or_state, kpi, nfhs_round):
+    start, stop = related_kpi_rows.get((india_or_state, nfhs_round, kpi), (0, 0))
+    return kpi_correlations.iloc[start : min(stop, start + related_kpis_top_k)]
+
+
 # %%
 # states list
 state_options = [{"label": l, "value": l} for l in sorted(data_states, key=str.lower)]
@@ -606,25 +1512,84 @@ district_scatter_row = dbc.Container(
 )
 
 # %%
-# filter gender indicators for trend analysis
-df_nfhs_345 = (
-    pd.concat(
-        [
-            df_list[0],
-            df_list[2][
-                ["Indicator", "NFHS-4 (2015-16)", "Indicator Type", "Gender", "State"]
-            ].rename(columns={"NFHS-4 (2015-16)": "Total"}),
-            df_list[2].drop(columns="NFHS-4 (2015-16)"),
-        ],
-        ignore_index=True,
-    )
-    .fillna({"NFHS": "NFHS 4", "Year (give as a period)": "2016"})
-    .query("Gender.isnull()", engine="python")
-    .reset_index(drop=True)
-    .replace({"State": {"INDIA": "India"}})
-    .replace({"State": {"India": "All India"}})
+# dbc select: related indicators scope and KPI
+dd_related_scope = dbc.Select(
+    id="related-scope-dd",
+    size="sm",
+    options=india_or_state_options,
+    value="All India",
+)
+dd_related_kpi = dbc.Select(
+    id="related-kpi-dd",
+    size="sm",
+    options=district_map_options,
+    value=district_kpi_map[10],
 )
 
+# %%
+# dbc related indicators row
+related_kpi_row = dbc.Container(
+    [
+        dbc.Row(
+            [
+                dbc.Col(
+                    html.Div(
+                        [
+                            html.P(
+                                "Select All India or State",
+                                style={
+                                    "fontWeight": "bold",  # 'normal', #
+                                    "textAlign": "left",  # 'center', #
+                                    # 'paddingTop': '25px',
+                                    "color": "DeepSkyBlue",
+                                    "fontSize": "14px",
+                                    "marginBottom": "10px",
+                                },
+                            ),
+                            dd_related_scope,
+                        ]
+                    ),
+                    width=2,
+                ),
+                dbc.Col(
+                    html.Div(
+                        [
+                            html.P(
+                                "Select KPI: most related district KPIs",
+                                style={
+                                    "fontWeight": "bold",  # 'normal', #
+                                    "textAlign": "left",  # 'center', #
+                                    # 'paddingTop': '25px',
+                                    "color": "DeepSkyBlue",
+                                    "fontSize": "14px",
+                                    "marginBottom": "10px",
+                                },
+                            ),
+                            dd_related_kpi,
+                        ]
+                    ),
+                    width=10,
+                ),
+            ],
+            justify="evenly",
+            align="center",
+            style={
+                "marginBottom": "25px",
+            },
+        ),
+        dbc.Row(
+            [
+                dbc.Col(html.Div(id="related-kpis-table"), width=6),
+                dbc.Col(html.Div(id="related-kpis-table-2"), width=6),
+            ],
+            justify="evenly",
+            align="start",
+        ),
+    ],
+    fluid=True,
+)
+
+# %%
 # retain Indicator Types - Indicator combinations
 nfhs_345_ind_df = df_nfhs_345.groupby(
     ["Indicator Type", "Indicator"], sort=False, as_index=False
@@ -633,35 +1598,92 @@ nfhs_345_ind_df = df_nfhs_345.groupby(
 # states or india: nfhs_345 list
 nfhs_345_states = sorted(df_nfhs_345.State.unique(), key=str.lower)
 
-# %%
-# filter uncleaned data in numerical columns
-num_cols = ["Urban", "Rural", "Total"]
-for col in num_cols:
-    filter_na_345 = df_nfhs_345[col].isnull()
-    filter_non_num_345 = pd.to_numeric(df_nfhs_345[col], errors="coerce").isnull()
-    # non numerics
-    print("Ask RAKESH about PRESENCE of NON-NUMERICS")
-    print(df_nfhs_345[filter_non_num_345 & ~filter_na_345][col].values[0])
-    # drop non-num
-    df_nfhs_345 = (
-        df_nfhs_345.drop(df_nfhs_345[filter_non_num_345 & ~filter_na_345].index)
-        .astype({col: "float64"})
-        .reset_index(drop=True)
+# trend long table: melted, typed and sorted once, (State, Indicator) -> rows
+nfhs_345_trend_df = (
+    df_nfhs_345.melt(
+        id_vars=["Indicator", "State", "NFHS", "Year (give as a period)"],
+        value_vars=["Urban", "Rural", "Total"],
     )
-
-    # negatives detected
-    filter_neg_345 = df_nfhs_345[col] < 0
-    print("Ask RAKESH about PRESENCE of NEGATIVES")
-    print(
-        f"No negatives for df column {col}"
-        if df_nfhs_345[filter_neg_345].empty
-        else df_nfhs_345[filter_neg_345].values[0]
+    .sort_values(
+        ["Year (give as a period)", "State", "Indicator"],
+        kind="stable",
+        ignore_index=True,
     )
-    # drop negatives
-    df_nfhs_345 = df_nfhs_345.drop(df_nfhs_345[filter_neg_345].index).reset_index(
-        drop=True
+    .astype({"value": "float64"})
+)
+nfhs_345_trend_rows = nfhs_345_trend_df.groupby(
+    ["State", "Indicator"], sort=False
+).indices
+nfhs_345_trend_df = nfhs_345_trend_df.set_index(["State", "Indicator"])
+
+
+def trend_rows_for(state_values, kpi_values):
+    # multi-select dropdowns send a string for a single value
+    if isinstance(state_values, str):
+        state_values = [state_values]
+    if isinstance(kpi_values, str):
+        kpi_values = [kpi_values]
+    rows = [
+        nfhs_345_trend_rows[(state, kpi)]
+        for state in dict.fromkeys(state_values)
+        for kpi in dict.fromkeys(kpi_values)
+        if (state, kpi) in nfhs_345_trend_rows
+    ]
+    # sorted positions keep the table order (year, state, indicator)
+    return nfhs_345_trend_df.iloc[np.sort(np.concatenate(rows or [[]]).astype(int))]
+
+
+# trend above this many traces ((State, Indicator) x Urban/Rural/Total): one
+# trace per Urban/Rural/Total, series split by gaps, instead of one per line
+trend_trace_budget = int(os.environ.get("NFHS_TREND_TRACE_BUDGET", "60"))
+trend_render_stats = {"traces": 0, "merged": 0}
+
+
+def merged_trend_fig(display_df):
+    trend_fig = go.Figure()
+    # px symbol and dash sequences, in order of appearance of the variables
+    variable_styles = {
+        "Urban": ("circle", "solid"),
+        "Rural": ("diamond", "dot"),
+        "Total": ("square", "dash"),
+    }
+    for variable, (symbol, dash) in variable_styles.items():
+        series_df = (
+            display_df[display_df.variable == variable]
+            .reset_index()
+            .sort_values(["State", "Indicator"], kind="stable")
+        )
+        if series_df.empty:
+            continue
+        series_keys = series_df[["State", "Indicator"]]
+        # None/NaN after each series breaks the line
+        gaps = np.flatnonzero(
+            (series_keys != series_keys.shift()).any(axis=1).values
+        )[1:]
+        years = series_df["Year (give as a period)"].values.astype(object)
+        trend_fig.add_trace(
+            go.Scatter(
+                x=np.insert(years, gaps, None),
+                y=np.insert(series_df.value.values, gaps, np.nan),
+                customdata=np.insert(
+                    series_df[["State", "Indicator", "NFHS"]].values, gaps, None, axis=0
+                ),
+                mode="lines+markers",
+                name=variable,
+                line=dict(shape="spline", dash=dash),
+                marker=dict(symbol=symbol),
+                hovertemplate="%{customdata[0]}<br>%{customdata[1]}<br>"
+                f"variable={variable}<br>"
+                "Year (give as a period)=%{x}<br>value=%{y}<br>"
+                "NFHS=%{customdata[2]}<extra></extra>",
+            )
+        )
+    return trend_fig.update_layout(
+        xaxis=dict(title="Year (give as a period)", categoryorder="category ascending"),
+        yaxis=dict(title="value"),
     )
 
+
 # %%
 # dcc dropdown: nfhs 345 states --> dcc allows multi, styling not as dbc
 dd_state_4_trend = dcc.Dropdown(
@@ -807,6 +1829,26 @@ dd_states_equity = dbc.Select(
 
 # %%
 # dbc ButtonGroup with RadioItems
+disagg_options = [
+    {"label": "Residence", "value": "Residence"},
+    {"label": "Wealth", "value": "Wealth"},
+    {"label": "Women's Education", "value": "Women's Education"},
+    {"label": "Caste", "value": "Caste"},
+    {"label": "Religion", "value": "Religion"},
+]
+# equity columns per disaggregation, in bar order
+equity_disaggregations = {
+    "Residence": ["Total", "Rural", "Urban"],
+    "Wealth": ["Poorest", "Poor", "Middle", "Rich", "Richest"],
+    "Women's Education": [
+        "No education",
+        "Primary education",
+        "Secondary education",
+        "Higher education",
+    ],
+    "Caste": ["SC", "ST", "OBC", "Others"],
+    "Religion": ["Hindu", "Muslim", "Other"],
+}
 button_group_disagg = html.Div(
     [
         dbc.RadioItems(
@@ -815,19 +1857,62 @@ button_group_disagg = html.Div(
             inputClassName="btn-check",
             labelClassName="btn btn-outline-info",
             labelCheckedClassName="active",
-            options=[
-                {"label": "Residence", "value": "Residence"},
-                {"label": "Wealth", "value": "Wealth"},
-                {"label": "Women's Education", "value": "Women's Education"},
-                {"label": "Caste", "value": "Caste"},
-                {"label": "Religion", "value": "Religion"},
-            ],
+            options=disagg_options,
             value="Residence",
         ),
     ],
     className="radio-group",
 )
 
+# %%
+# equity cube: all disaggregations melted once and sent per state, radio changes
+# only pick columns in the browser (see assets/clientside.js)
+equity_rounds = ["NFHS-4 (2015-16)", "NFHS-5 (2019-21)"]
+equity_long_df = df_equity.melt(
+    id_vars=["Indicator", "State", "Year"],
+    value_vars=[col for cols in equity_disaggregations.values() for col in cols],
+)
+equity_store = {}
+for (state, year, variable), group_df in equity_long_df.groupby(
+    ["State", "Year", "variable"], sort=False
+):
+    state_rounds = equity_store.setdefault(state, {"state": state, "rounds": {}})
+    round_data = state_rounds["rounds"].setdefault(
+        year, {"x": group_df.Indicator.tolist(), "y": {}}
+    )
+    round_data["y"][variable] = [
+        None if pd.isnull(v) else float(v) for v in group_df.value
+    ]
+
+# bar figure layout per round as px.bar would build it, template sent once
+equity_layouts = [
+    orjson.loads(
+        pio.to_json(
+            px.bar(
+                equity_long_df.iloc[:0],
+                x="Indicator",
+                y="value",
+                color="variable",
+                barmode="group",
+                title=nfhs_round,
+            )
+            .update_yaxes(range=[0, 100])
+            .update_layout(legend_title_text="variable")
+        )
+    )["layout"]
+    for nfhs_round in equity_rounds
+]
+equity_base = {
+    "rounds": equity_rounds,
+    "disaggregations": equity_disaggregations,
+    "colorway": equity_layouts[0]["template"]["layout"]["colorway"],
+    "template": equity_layouts[0]["template"],
+    "layouts": [
+        {key: value for key, value in layout.items() if key != "template"}
+        for layout in equity_layouts
+    ],
+}
+
 # %%
 # dbc states equity bar row
 state_equity_row = dbc.Container(
@@ -892,17 +1977,49 @@ state_equity_row = dbc.Container(
             justify="evenly",
             align="center",
         ),
+        # equity bars are assembled clientside: state cube + disaggregation
+        dcc.Store(id="equity-base", data=equity_base),
+        dcc.Store(id="equity-data"),
     ],
     fluid=True,
 )
 
 # %%
 fontawesome_stylesheet = "https://use.fontawesome.com/releases/v5.8.1/css/all.css"
+# NFHS_BACKGROUND_CALLBACKS=1: the scatter callback runs as diskcache jobs in
+# separate processes, so slow renders don't hold a web worker
+background_callbacks = os.environ.get("NFHS_BACKGROUND_CALLBACKS", "0") == "1"
+if background_callbacks:
+    # pinned in requirements.txt (with multiprocess and psutil), used by this mode
+    import diskcache
+    from dash.long_callback import DiskcacheLongCallbackManager
+
+    long_callback_manager = DiskcacheLongCallbackManager(
+        diskcache.Cache(
+            os.environ.get(
+                "NFHS_BACKGROUND_DIR", os.path.join(http_cache_dir, "long_callbacks")
+            )
+        )
+    )
+else:
+    long_callback_manager = None
+
 # Build App
 app = Dash(
-    __name__, external_stylesheets=[dbc.themes.BOOTSTRAP, fontawesome_stylesheet]
+    __name__,
+    external_stylesheets=[dbc.themes.BOOTSTRAP, fontawesome_stylesheet],
+    long_callback_manager=long_callback_manager,
 )
 
+
+def expensive_callback(*args, **kwargs):
+    # background jobs are polled by the browser; a new trigger with other inputs
+    # terminates the job still running for the previous ones
+    if background_callbacks:
+        return app.long_callback(*args, interval=500, **kwargs)
+    return app.callback(*args, **kwargs)
+
+
 # to deploy using WSGI server
 server = app.server
 # app tittle for web browser
@@ -993,6 +2110,21 @@ app.layout = html.Div(
                 "margin-bottom": "0",
             }
         ),
+        # div related indicators row (no loading added)
+        html.Div(
+            [related_kpi_row],
+            style={
+                "paddingTop": "20px",
+            },
+        ),
+        html.Hr(
+            style={
+                "color": "DeepSkyBlue",
+                "height": "3px",
+                "margin-top": "30px",
+                "margin-bottom": "0",
+            }
+        ),
         # div trend row (no loading added)
         html.Div(
             [state_trend_row],
@@ -1018,6 +2150,286 @@ app.layout = html.Div(
     ]
 )
 
+
+# %%
+# geometry store route: pre-serialized geojson, versioned url for long caching
+def geo_url(scope):
+    return app.get_relative_path(
+        f"/geo/{quote(scope, safe='')}.json?v={geo_etags[scope]}"
+    )
+
+
+@server.route("/geo/<scope>.json")
+def serve_geo(scope):
+    if scope not in geo_store:
+        flask.abort(404)
+    response = flask.Response(geo_store[scope], mimetype="application/json")
+    response.set_etag(geo_etags[scope])
+    response.cache_control.public = True
+    response.cache_control.max_age = 86400
+    return response.make_conditional(flask.request)
+
+
+# %%
+# figure cache: serialized callback outputs keyed by (callback, inputs), least
+# recently used entries evicted past NFHS_FIGURE_CACHE_MB
+figure_cache_limit = int(float(os.environ.get("NFHS_FIGURE_CACHE_MB", "64")) * 2**20)
+figure_cache = OrderedDict()
+figure_cache_lock = threading.Lock()
+figure_cache_stats = {"hits": 0, "misses": 0, "evictions": 0, "entries": 0, "bytes": 0}
+
+
+def serialize_output(output):
+    # multi-output callbacks return tuples: flag them to restore on load
+    is_tuple = isinstance(output, tuple)
+    content = pio.json.to_json_plotly(
+        {"tuple": is_tuple, "output": list(output) if is_tuple else output},
+        engine="orjson",
+    )
+    return content.encode()
+
+
+def deserialize_output(content):
+    cached = orjson.loads(content)
+    return tuple(cached["output"]) if cached["tuple"] else cached["output"]
+
+
+def figure_cache_get(key):
+    with figure_cache_lock:
+        content = figure_cache.get(key)
+        if content is None:
+            figure_cache_stats["misses"] += 1
+            return None
+        figure_cache.move_to_end(key)
+        figure_cache_stats["hits"] += 1
+        return content
+
+
+def figure_cache_put(key, content):
+    size = len(key) + len(content)
+    if size > figure_cache_limit:
+        return
+    with figure_cache_lock:
+        if key in figure_cache:
+            return
+        figure_cache[key] = content
+        figure_cache_stats["bytes"] += size
+        while figure_cache_stats["bytes"] > figure_cache_limit:
+            old_key, old_content = figure_cache.popitem(last=False)
+            figure_cache_stats["bytes"] -= len(old_key) + len(old_content)
+            figure_cache_stats["evictions"] += 1
+        figure_cache_stats["entries"] = len(figure_cache)
+
+
+# shared figure cache (second level): survives restarts, shared by workers
+# NFHS_SHARED_CACHE: "sqlite" (default), "sqlite:///path", "redis://..." or "off"
+shared_cache_url = os.environ.get("NFHS_SHARED_CACHE", "sqlite")
+shared_cache_ttl = int(os.environ.get("NFHS_SHARED_CACHE_TTL", str(7 * 86400)))
+# sqlite: entry cap within a data version, oldest entries evicted first
+shared_cache_max_entries = int(os.environ.get("NFHS_SHARED_CACHE_MAX_ENTRIES", "5000"))
+shared_cache_stats = {"hits": 0, "misses": 0, "errors": 0}
+shared_cache_local = threading.local()
+
+
+def sqlite_cache_path():
+    if shared_cache_url.startswith("sqlite:///"):
+        return shared_cache_url[len("sqlite:///") - 1 :]
+    return os.path.join(http_cache_dir, "figures.sqlite")
+
+
+def sqlite_connection():
+    # one connection per thread and process (not shared across fork)
+    connection = getattr(shared_cache_local, "connection", None)
+    if connection is None or shared_cache_local.pid != os.getpid():
+        os.makedirs(os.path.dirname(sqlite_cache_path()), exist_ok=True)
+        connection = sqlite3.connect(sqlite_cache_path(), timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+        columns = [row[1] for row in connection.execute("PRAGMA table_info(figures)")]
+        if columns and "stored" not in columns:
+            # cache from before entries were timestamped
+            connection.execute("DROP TABLE figures")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS figures (version TEXT, key BLOB, "
+            "content BLOB, stored REAL, PRIMARY KEY (version, key))"
+        )
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS figures_stored ON figures (stored)"
+        )
+        shared_cache_local.connection = connection
+        shared_cache_local.pid = os.getpid()
+    return connection
+
+
+def redis_connection():
+    connection = getattr(shared_cache_local, "connection", None)
+    if connection is None or shared_cache_local.pid != os.getpid():
+        # optional dependency, only needed for a redis:// cache
+        import redis
+
+        connection = redis.Redis.from_url(shared_cache_url)
+        shared_cache_local.connection = connection
+        shared_cache_local.pid = os.getpid()
+    return connection
+
+
+def redis_key(key):
+    return f"nfhs:{data_version}:{hashlib.sha256(key).hexdigest()}"
+
+
+def shared_cache_get(key):
+    try:
+        if shared_cache_url.startswith("sqlite"):
+            row = (
+                sqlite_connection()
+                .execute(
+                    "SELECT content FROM figures "
+                    "WHERE version = ? AND key = ? AND stored >= ?",
+                    (data_version, key, time.time() - shared_cache_ttl),
+                )
+                .fetchone()
+            )
+            content = row[0] if row else None
+        elif shared_cache_url.startswith("redis"):
+            content = redis_connection().get(redis_key(key))
+        else:
+            return None
+    except Exception:
+        shared_cache_stats["errors"] += 1
+        return None
+    shared_cache_stats["hits" if content is not None else "misses"] += 1
+    return content
+
+
+def shared_cache_put(key, content):
+    try:
+        if shared_cache_url.startswith("sqlite"):
+            with sqlite_connection() as connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO figures VALUES (?, ?, ?, ?)",
+                    (data_version, key, content, time.time()),
+                )
+                sqlite_evict(connection)
+        elif shared_cache_url.startswith("redis"):
+            redis_connection().set(redis_key(key), content, ex=shared_cache_ttl)
+    except Exception:
+        shared_cache_stats["errors"] += 1
+
+
+def sqlite_evict(connection):
+    # keys hold arbitrary multi-select lists: bound the table by age and entries
+    connection.execute(
+        "DELETE FROM figures WHERE stored < ?", (time.time() - shared_cache_ttl,)
+    )
+    connection.execute(
+        "DELETE FROM figures WHERE rowid IN "
+        "(SELECT rowid FROM figures ORDER BY stored DESC LIMIT -1 OFFSET ?)",
+        (shared_cache_max_entries,),
+    )
+
+
+def shared_cache_invalidate():
+    # entries of other data versions, expired or past the cap (redis keys are
+    # versioned and expire)
+    if not shared_cache_url.startswith("sqlite"):
+        return
+    try:
+        with sqlite_connection() as connection:
+            connection.execute(
+                "DELETE FROM figures WHERE version != ?", (data_version,)
+            )
+            sqlite_evict(connection)
+    except Exception:
+        shared_cache_stats["errors"] += 1
+
+
+shared_cache_invalidate()
+
+
+# undecorated callbacks by cache name, rendered directly by the warm-up
+cached_callbacks = {}
+# serialized output size of fresh renders per callback (~ response size)
+render_stats = {}
+
+
+# single flight: concurrent identical calls (same callback and inputs) wait for
+# the one in progress and share its output instead of rendering it again
+in_flight = {}
+in_flight_lock = threading.Lock()
+single_flight_stats = {"computed": 0, "deduplicated": 0}
+
+
+def single_flight(key, compute):
+    with in_flight_lock:
+        call = in_flight.get(key)
+        leader = call is None
+        if leader:
+            call = in_flight[key] = {"done": threading.Event()}
+            single_flight_stats["computed"] += 1
+        else:
+            single_flight_stats["deduplicated"] += 1
+    if not leader:
+        call["done"].wait()
+        if "error" in call:
+            raise call["error"]
+        return call["content"]
+    try:
+        call["content"] = compute()
+        return call["content"]
+    except Exception as error:
+        call["error"] = error
+        raise
+    finally:
+        with in_flight_lock:
+            del in_flight[key]
+        call["done"].set()
+
+
+def cached_figure(callback_name):
+    # data never changes at runtime: same inputs, same figures
+    def decorator(func):
+        cached_callbacks[callback_name] = func
+
+        def compute(key, args):
+            content = shared_cache_get(key)
+            if content is None:
+                content = serialize_output(func(*args))
+                shared_cache_put(key, content)
+                stats = render_stats.setdefault(
+                    callback_name, {"renders": 0, "bytes_last": 0, "bytes_max": 0}
+                )
+                stats["renders"] += 1
+                stats["bytes_last"] = len(content)
+                stats["bytes_max"] = max(stats["bytes_max"], len(content))
+            figure_cache_put(key, content)
+            return content
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            key = orjson.dumps([callback_name, args])
+            content = figure_cache_get(key)
+            if content is None:
+                content = single_flight(key, lambda: compute(key, args))
+            return deserialize_output(content)
+
+        return wrapper
+
+    return decorator
+
+
+@server.route("/_nfhs/stats")
+def serve_stats():
+    return flask.jsonify(
+        {
+            "data_version": data_version,
+            "figure_cache": figure_cache_stats,
+            "shared_cache": shared_cache_stats,
+            "renders": render_stats,
+            "single_flight": single_flight_stats,
+            "trend": trend_render_stats,
+        }
+    )
+
+
 # %%
 # function to avoid figure display inline
 def update_cm_fig(cm_fig):
@@ -1048,39 +2460,67 @@ nan_red_y_blue = [
 ]
 
 
+# district map templates: base choropleth per scope (locations, geometry url,
+# layout as px.choropleth would build it) made once with graph objects
+default_sequential = pio.templates[pio.templates.default].layout.colorscale.sequential
+
+
+def build_map_template(india_or_state):
+    scope_districts = district_geo_dict[india_or_state]
+    cmap_fig = go.Figure(
+        go.Choropleth(
+            geojson=geo_url(india_or_state),
+            featureidkey="properties.707_dist_7",  # 'properties.ST_NM', #
+            locations=scope_districts.District_geo.values,
+            z=np.full(len(scope_districts), -1.0),
+            coloraxis="coloraxis",
+            geo="geo",
+            hovertemplate="District_geo=%{location}<br>value=%{z}<extra></extra>",
+            name="",
+        ),
+        layout=dict(
+            geo=dict(
+                domain=dict(x=[0.0, 1.0], y=[0.0, 1.0]),
+                projection=dict(type="mercator"),
+            ),
+            coloraxis=dict(
+                colorbar=dict(title=dict(text="value")),
+                colorscale=default_sequential,
+            ),
+            legend=dict(tracegroupgap=0),
+        ),
+    )
+    return pio.json.to_json_plotly(update_cm_fig(cmap_fig), engine="orjson").encode()
+
+
+map_templates = {scope: build_map_template(scope) for scope in district_geo_dict}
+
+
 @app.callback(
-    Output("district-plot", "figure"),
-    Output("district-plot-r2", "figure"),
+    Output("district-map-base", "data"),
+    Input("india-or-state-dd", "value"),
+)
+# base map per scope: a clone of its template, sent once per scope change
+def district_map_base(india_or_state):
+    return {
+        "scope": india_or_state,
+        "figure": orjson.loads(map_templates[india_or_state]),
+    }
+
+
+@app.callback(
+    Output("district-map-values", "data"),
     Input("india-or-state-dd", "value"),
     Input("kpi-district-map-dd", "value"),
     # Input('nfhs-round-dd', 'value'),
 )
-# use dropdown values: update geo-json and indicator in map (district-wise)
+# use dropdown values: indicator values per round in base map order
+@cached_figure("map")
 def disp_in_district_map(india_or_state, distr_kpi):
 
-    # test if all_india
-    if india_or_state == "All India":
-        # query dataframe
-        display_df = district_map_df.query(
-            "variable == @distr_kpi & Round == 'NFHS-4'"
-        ).reset_index(drop=True)
-        display_df_r2 = district_map_df.query(
-            "variable == @distr_kpi & Round == 'NFHS-5'"
-        ).reset_index(drop=True)
-        # do not filter geojson
-        geofile = geo_json_dict
-    else:
-        # query dataframe
-        display_df = district_map_df.query(
-            "State == @india_or_state & variable == @distr_kpi & Round == 'NFHS-4'"
-        ).reset_index(drop=True)
-        display_df_r2 = district_map_df.query(
-            "State == @india_or_state & variable == @distr_kpi & Round == 'NFHS-5'"
-        ).reset_index(drop=True)
-        # filter geojson by state
-        geofile = {}
-        geofile["type"] = "FeatureCollection"
-        geofile["features"] = geo_dict[india_or_state]
+    # index lookup ("All India" is its own partition)
+    display_df = district_partition(india_or_state, distr_kpi, "NFHS-4")
+    display_df_r2 = district_partition(india_or_state, distr_kpi, "NFHS-5")
 
     # min-max block kpis - before setting missing as negatives
     district_kpi_min = display_df.value.min()
@@ -1094,186 +2534,218 @@ def disp_in_district_map(india_or_state, distr_kpi):
         pd.Series([district_kpi_max, district_kpi_max_2]).max(),
     ]
 
-    # set missing reporting districts
-    not_reported = np.setdiff1d(
-        district_geo_dict[india_or_state]["District name"].values,
-        display_df["District name"].values,
+    # scale according to indicator
+    dyn_color_scale = (
+        nan_blue_y_red if distr_kpi in kpi_color_inverse else nan_red_y_blue
     )
-    not_reported_geo = [
-        district_geo_dict[india_or_state]
-        .query("`District name` == @a_name")
-        .District_geo.values[0]
-        for a_name in not_reported
+
+    # set missing reporting districts as negatives
+    return {
+        "scope": india_or_state,
+        "z": scope_values(display_df, india_or_state).tolist(),
+        "z_r2": scope_values(display_df_r2, india_or_state).tolist(),
+        "range": [None if pd.isnull(v) else float(v) for v in full_range],
+        "colorscale": dyn_color_scale,
+    }
+
+
+# district maps: base figure with patched values, no server round-trip
+app.clientside_callback(
+    ClientsideFunction(namespace="nfhs", function_name="district_maps"),
+    Output("district-plot", "figure"),
+    Output("district-plot-r2", "figure"),
+    Input("district-map-base", "data"),
+    Input("district-map-values", "data"),
+)
+
+
+# %%
+# least squares lines for several rounds in one pass (closed form, no statsmodels)
+def ols_fits(rounds_xy):
+    n_points = max(len(x) for x, _ in rounds_xy)
+    x = np.full((len(rounds_xy), n_points), np.nan)
+    y = np.full((len(rounds_xy), n_points), np.nan)
+    for i, (x_round, y_round) in enumerate(rounds_xy):
+        x[i, : len(x_round)] = x_round
+        y[i, : len(y_round)] = y_round
+    # districts missing either kpi drop out, as in px trendline="ols"
+    valid = ~(np.isnan(x) | np.isnan(y))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        n = valid.sum(axis=1)
+        x_mean = np.where(valid, x, 0).sum(axis=1) / n
+        y_mean = np.where(valid, y, 0).sum(axis=1) / n
+        dx = np.where(valid, x - x_mean[:, None], 0)
+        dy = np.where(valid, y - y_mean[:, None], 0)
+        s_xx = (dx * dx).sum(axis=1)
+        s_xy = (dx * dy).sum(axis=1)
+        s_yy = (dy * dy).sum(axis=1)
+        slope = s_xy / s_xx
+        intercept = y_mean - slope * x_mean
+        r_sq = s_xy**2 / (s_xx * s_yy)
+    # line drawn across the fitted districts
+    x_min = np.where(valid, x, np.inf).min(axis=1)
+    x_max = np.where(valid, x, -np.inf).max(axis=1)
+    return [
+        {
+            "x": [x_min[i], x_max[i]],
+            "slope": slope[i],
+            "intercept": intercept[i],
+            "r_sq": r_sq[i],
+        }
+        for i in range(len(rounds_xy))
     ]
-    # concat not_reported as negatives
-    display_df = pd.concat(
-        [
+
+
+# scatter above this many districts per round: one webgl trace, colors by state
+scatter_webgl_points = int(os.environ.get("NFHS_SCATTER_WEBGL_POINTS", "400"))
+
+
+def district_scatter(display_df, kpi_1, kpi_2, title):
+    if len(display_df) <= scatter_webgl_points:
+        return px.scatter(
             display_df,
-            pd.DataFrame(
-                {
-                    "District_geo": not_reported_geo,
-                    "District_name": not_reported,
-                }
+            x=kpi_1,
+            y=kpi_2,
+            color="State",
+            opacity=0.5,
+            title=title,
+            hover_data=["District name"],
+        )
+    # same state colors as px (order of appearance), legend replaced by hover
+    state_codes, states = pd.factorize(display_df.State)
+    palette = px.colors.qualitative.Plotly
+    return go.Figure(
+        go.Scattergl(
+            x=display_df[kpi_1].values,
+            y=display_df[kpi_2].values,
+            mode="markers",
+            marker=dict(
+                color=[palette[code % len(palette)] for code in state_codes],
+                opacity=0.5,
             ),
-        ],
-        ignore_index=True,
-    ).fillna(-1)
-
-    # set missing reporting districts r2
-    not_reported_r2 = np.setdiff1d(
-        district_geo_dict[india_or_state]["District name"].values,
-        display_df_r2["District name"].values,
+            customdata=display_df[["State", "District name"]].values,
+            hovertemplate=f"State=%{{customdata[0]}}<br>{kpi_1}=%{{x}}<br>"
+            f"{kpi_2}=%{{y}}<br>District name=%{{customdata[1]}}<extra></extra>",
+            showlegend=False,
+        ),
+        layout=dict(
+            title=title,
+            xaxis_title=kpi_1,
+            yaxis_title=kpi_2,
+            margin=dict(t=60),
+        ),
     )
-    not_reported_geo_r2 = [
-        district_geo_dict[india_or_state]
-        .query("`District name` == @a_name")
-        .District_geo.values[0]
-        for a_name in not_reported_r2
-    ]
-    # concat not_reported as negatives
-    display_df_r2 = pd.concat(
-        [
-            display_df_r2,
-            pd.DataFrame(
-                {
-                    "District_geo": not_reported_geo_r2,
-                    "District_name": not_reported_r2,
-                }
-            ),
-        ],
-        ignore_index=True,
-    ).fillna(-1)
 
-    # scale according to indicator
-    dyn_color_scale = (
-        nan_blue_y_red if distr_kpi in kpi_color_inverse else nan_red_y_blue
-    )
 
-    # district map
-    cmap_fig = px.choropleth(
-        display_df,
-        geojson=geofile,
-        featureidkey="properties.707_dist_7",  # 'properties.ST_NM', #
-        locations="District_geo",
-        color="value",
-        # color_continuous_scale = "RdBu",
-        color_continuous_scale=dyn_color_scale,
-        range_color=full_range,
-        # color_discrete_map={'red':'red', 'orange':'orange', 'green':'green'},
-        # hover_data=[dd_value],
-        projection="mercator",
+def add_trendline(scatter_fig, fit):
+    line_x = np.array(fit["x"])
+    scatter_fig.add_trace(
+        go.Scatter(
+            x=line_x,
+            y=fit["intercept"] + fit["slope"] * line_x,
+            mode="lines",
+            name="Overall Trendline",
+            legendgroup="Overall Trendline",
+            showlegend=True,
+            hovertemplate=f"<b>OLS trendline</b><br>R<sup>2</sup>="
+            f"{round(fit['r_sq'], 2)}",
+        )
     )
+    return scatter_fig
 
-    # district map - round 2
-    cmap_fig_r2 = px.choropleth(
-        display_df_r2,
-        geojson=geofile,
-        featureidkey="properties.707_dist_7",  # 'properties.ST_NM', #
-        locations="District_geo",
-        color="value",
-        # color_continuous_scale = "RdBu",
-        color_continuous_scale=dyn_color_scale,
-        range_color=full_range,
-        # color_discrete_map={'red':'red', 'orange':'orange', 'green':'green'},
-        # hover_data=[dd_value],
-        projection="mercator",
-    )
 
-    return update_cm_fig(cmap_fig), update_cm_fig(cmap_fig_r2)
+# %%
+# per-round figures of a callback built side by side in a bounded pool, one per
+# process; NFHS_ROUND_POOL: "thread" (default), "serial" or "process" (opt-in:
+# forks from a threaded request and pickles frames and figures both ways)
+round_pool = os.environ.get("NFHS_ROUND_POOL", "thread")
+# NFHS_ROUND_WORKERS: pool size, below 2 (default on a single core) is serial
+round_workers = int(
+    os.environ.get("NFHS_ROUND_WORKERS", "2" if (os.cpu_count() or 1) > 1 else "1")
+)
+round_executors = {}
+round_executors_lock = threading.Lock()
+
+
+def round_executor():
+    with round_executors_lock:
+        executor = round_executors.get(os.getpid())
+        if executor is None:
+            # daemonic processes (e.g. pool workers) can't start children
+            if (
+                round_pool == "process"
+                and "fork" in mp.get_all_start_methods()
+                and not mp.current_process().daemon
+            ):
+                executor = ProcessPoolExecutor(
+                    max_workers=round_workers, mp_context=mp.get_context("fork")
+                )
+            else:
+                executor = ThreadPoolExecutor(max_workers=round_workers)
+            round_executors[os.getpid()] = executor
+        return executor
+
+
+def build_rounds(func, args_list):
+    # results in args order, whatever finishes first
+    if round_pool == "serial" or round_workers < 2:
+        return [func(*args) for args in args_list]
+    return list(round_executor().map(func, *zip(*args_list)))
+
+
+def scatter_round_fig(display_df, kpi_1, kpi_2, title, fit, full_range):
+    # one round's scatter, serialized in the worker
+    scatter_fig = (
+        district_scatter(display_df, kpi_1, kpi_2, title)
+        .update_traces(marker=dict(size=16))
+        .update_yaxes(title_font=dict(size=11))
+        .update_xaxes(title_font=dict(size=11))
+    )
+    add_trendline(scatter_fig, fit)
+    x_avg = display_df[kpi_1].mean()
+    scatter_fig.add_vline(
+        x=x_avg, line_dash="dash", line_width=3, line_color="green"
+    ).update_traces(line_width=3)
+    y_avg = display_df[kpi_2].mean()
+    scatter_fig.add_hline(
+        y=y_avg, line_dash="dash", line_width=3, line_color="green"
+    ).update_traces(line_width=3)
+    # update axis in scatters
+    scatter_fig.update_xaxes(range=[full_range[0][0], full_range[1][0]])
+    scatter_fig.update_yaxes(range=[full_range[0][1], full_range[1][1]])
+    return pio.json.to_json_plotly(scatter_fig, engine="orjson")
 
 
 # %%
-@app.callback(
+@expensive_callback(
     Output("district-plot-scatter", "figure"),
     Output("district-plot-scatter-2", "figure"),
     Input("my-states-dd", "value"),
     Input("kpi-district-list-1", "value"),
     Input("kpi-district-list-2", "value"),
 )
+@cached_figure("scatter")
 def update_scatter(state_values, kpi_1, kpi_2):
 
     if not state_values:
         return label_no_fig, label_no_fig
 
-    # query dataframe
+    # slice per-round matrices
     kpi_list = [kpi_1, kpi_2]
-    display_df = (
-        district_map_df.query(
-            "State in @state_values & variable in @kpi_list & Round == 'NFHS-4'"
-        )
-        .pivot(
-            index=["State", "District name"],
-            columns="variable",
-            values="value",
-        )
-        .reset_index()
-    )
+    display_df = district_wide_for(state_values, kpi_list, "NFHS-4")
 
-    display_df_2 = (
-        district_map_df.query(
-            "State in @state_values & variable in @kpi_list & Round == 'NFHS-5'"
-        )
-        .pivot(
-            index=["State", "District name"],
-            columns="variable",
-            values="value",
-        )
-        .reset_index()
-    )
+    display_df_2 = district_wide_for(state_values, kpi_list, "NFHS-5")
 
     if display_df.empty or display_df_2.empty:
         return label_no_fig, label_no_fig
     else:
-        scatter_fig = (
-            px.scatter(
-                display_df,
-                x=kpi_1,
-                y=kpi_2,
-                color="State",
-                opacity=0.5,
-                trendline="ols",
-                trendline_scope="overall",
-                title="NFHS-4 (2015-16)",
-                hover_data=["District name"],
-            )
-            .update_traces(marker=dict(size=16))
-            .update_yaxes(title_font=dict(size=11))
-            .update_xaxes(title_font=dict(size=11))
-        )
-        x_avg = display_df[kpi_1].mean()
-        scatter_fig.add_vline(
-            x=x_avg, line_dash="dash", line_width=3, line_color="green"
-        ).update_traces(line_width=3)
-        y_avg = display_df[kpi_2].mean()
-        scatter_fig.add_hline(
-            y=y_avg, line_dash="dash", line_width=3, line_color="green"
-        ).update_traces(line_width=3)
-
-        scatter_fig_2 = (
-            px.scatter(
-                display_df_2,
-                x=kpi_1,
-                y=kpi_2,
-                color="State",
-                opacity=0.5,
-                trendline="ols",
-                trendline_scope="overall",
-                title="NFHS-5 (2019-21)",
-                hover_data=["District name"],
-            )
-            .update_traces(marker=dict(size=16))
-            .update_yaxes(title_font=dict(size=11))
-            .update_xaxes(title_font=dict(size=11))
+        # both rounds' trendlines in one batched fit
+        fit, fit_2 = ols_fits(
+            [
+                (display_df[kpi_1].values, display_df[kpi_2].values),
+                (display_df_2[kpi_1].values, display_df_2[kpi_2].values),
+            ]
         )
-        x_avg_2 = display_df_2[kpi_1].mean()
-        scatter_fig_2.add_vline(
-            x=x_avg_2, line_dash="dash", line_width=3, line_color="green"
-        ).update_traces(line_width=3)
-        y_avg_2 = display_df_2[kpi_2].mean()
-        scatter_fig_2.add_hline(
-            y=y_avg_2, line_dash="dash", line_width=3, line_color="green"
-        ).update_traces(line_width=3)
-
         # adjust scales for comparisson
         x_min = display_df[kpi_1].min()
         y_min = display_df[kpi_2].min()
@@ -1294,11 +2766,16 @@ def update_scatter(state_values, kpi_1, kpi_2):
                 pd.Series([y_max, y_max_2]).max() * 1.1,
             ],
         ]
-        # update axis in scatters
-        scatter_fig.update_xaxes(range=[full_range[0][0], full_range[1][0]])
-        scatter_fig.update_yaxes(range=[full_range[0][1], full_range[1][1]])
-        scatter_fig_2.update_xaxes(range=[full_range[0][0], full_range[1][0]])
-        scatter_fig_2.update_yaxes(range=[full_range[0][1], full_range[1][1]])
+        scatter_fig, scatter_fig_2 = [
+            orjson.loads(content)
+            for content in build_rounds(
+                scatter_round_fig,
+                [
+                    (display_df, kpi_1, kpi_2, "NFHS-4 (2015-16)", fit, full_range),
+                    (display_df_2, kpi_1, kpi_2, "NFHS-5 (2019-21)", fit_2, full_range),
+                ],
+            )
+        ]
 
     # check for missing reported indicators for NFHS rounds
     plot_1_flag = display_df.dropna(axis=1, how="all").shape[1] < display_df.shape[1]
@@ -1309,35 +2786,48 @@ def update_scatter(state_values, kpi_1, kpi_2):
     if plot_1_flag & plot_2_flag:
         return label_no_fig, label_no_fig
     elif plot_1_flag:
-        r_sq_2 = round(
-            px.get_trendline_results(scatter_fig_2).px_fit_results.iloc[0].rsquared, 2
-        )
-        scatter_fig_2.data[
-            -1
-        ].hovertemplate = f"<b>OLS trendline</b><br>R<sup>2</sup>={r_sq_2}"
         return label_no_fig, scatter_fig_2
     elif plot_2_flag:
-        r_sq = round(
-            px.get_trendline_results(scatter_fig).px_fit_results.iloc[0].rsquared, 2
-        )
-        scatter_fig.data[
-            -1
-        ].hovertemplate = f"<b>OLS trendline</b><br>R<sup>2</sup>={r_sq}"
         return scatter_fig, label_no_fig
     else:
-        r_sq = round(
-            px.get_trendline_results(scatter_fig).px_fit_results.iloc[0].rsquared, 2
+        return scatter_fig, scatter_fig_2
+
+
+# %%
+@app.callback(
+    Output("related-kpis-table", "children"),
+    Output("related-kpis-table-2", "children"),
+    Input("related-scope-dd", "value"),
+    Input("related-kpi-dd", "value"),
+)
+def update_related_kpis(india_or_state, kpi):
+    # precomputed correlations: lookup only
+    tables = []
+    for nfhs_round, title in [
+        ("NFHS-4", "NFHS-4 (2015-16)"),
+        ("NFHS-5", "NFHS-5 (2019-21)"),
+    ]:
+        related_df = related_kpis(india_or_state, kpi, nfhs_round)
+        if related_df.empty:
+            tables.append(html.P("No matching data"))
+            continue
+        table_df = pd.DataFrame(
+            {
+                "Related KPI": related_df.related.astype(object).values,
+                "r": related_df.r.round(2).values,
+                "R\u00b2": related_df.r_sq.round(2).values,
+                "Districts": related_df.districts.values,
+            }
         )
-        scatter_fig.data[
-            -1
-        ].hovertemplate = f"<b>OLS trendline</b><br>R<sup>2</sup>={r_sq}"
-        r_sq_2 = round(
-            px.get_trendline_results(scatter_fig_2).px_fit_results.iloc[0].rsquared, 2
+        tables.append(
+            [
+                html.H6(title),
+                dbc.Table.from_dataframe(
+                    table_df, striped=True, bordered=True, hover=True, size="sm"
+                ),
+            ]
         )
-        scatter_fig_2.data[
-            -1
-        ].hovertemplate = f"<b>OLS trendline</b><br>R<sup>2</sup>={r_sq_2}"
-        return scatter_fig, scatter_fig_2
+    return tables
 
 
 # %%
@@ -1366,28 +2856,24 @@ def update_indicator_options(indicator_type):
     Input("state-trend-dd", "value"),
     Input("indicator-345-dd", "value"),
 )
+@cached_figure("trend")
 def update_trend(state_values, kpi_values):
 
     if not state_values or not kpi_values:
         return label_no_fig
 
-    display_df = (
-        df_nfhs_345.query("State in @state_values & Indicator in @kpi_values")
-        .melt(
-            id_vars=["Indicator", "State", "NFHS", "Year (give as a period)"],
-            value_vars=["Urban", "Rural", "Total"],
-        )
-        .sort_values(
-            ["Year (give as a period)", "State", "Indicator"],
-            ignore_index=True,
-        )
-        .set_index(["State", "Indicator"])
-        .astype({"value": "float64"})
-    )
+    display_df = trend_rows_for(state_values, kpi_values)
 
     if display_df.empty:
         return label_no_fig
     else:
+        n_traces = display_df.index.nunique() * display_df.variable.nunique()
+        if n_traces > trend_trace_budget:
+            trend_render_stats["merged"] += 1
+            return merged_trend_fig(display_df).update_layout(
+                legend=dict(font=dict(size=8), y=0.5, x=1.1)
+            )
+        trend_render_stats["traces"] += 1
         trend_fig = px.line(
             display_df,
             x="Year (give as a period)",
@@ -1406,64 +2892,131 @@ def update_trend(state_values, kpi_values):
         
 # %%
 @app.callback(
+    Output("equity-data", "data"),
+    Input("dd-states-equity", "value"),
+)
+# every disaggregation of the state, sent once per state change
+def update_equity_data(state_value):
+    return equity_store.get(state_value, {"state": state_value, "rounds": {}})
+
+
+# equity bars: disaggregation switching with no server round-trip
+app.clientside_callback(
+    ClientsideFunction(namespace="nfhs", function_name="equity_bars"),
     Output("state-equity-plot", "figure"),
     Output("state-equity-plot-2", "figure"),
-    Input("dd-states-equity", "value"),
+    Input("equity-data", "data"),
     Input("radios-disagg", "value"),
+    State("equity-base", "data"),
 )
-def update_equity(state_value, disagg_value):
-
-    if disagg_value == "Residence":
-        col_map = ["Total", "Rural", "Urban"]
-    elif disagg_value == "Wealth":
-        col_map = ["Poorest", "Poor", "Middle", "Rich", "Richest"]
-    elif disagg_value == "Women's Education":
-        col_map = [
-            "No education",
-            "Primary education",
-            "Secondary education",
-            "Higher education",
+
+
+# %%
+# geometry benchmark: payload and figure build time per level of detail
+def benchmark_geo_levels(sample_state="Kerala", repeat=3):
+    print("level   scope        payload KiB   gzip KiB   figure+json ms")
+    for level in geo_levels:
+        geo_json = geo_json_level(level)
+        level_store = build_geo_store(geo_json)
+        level_store["All India"] = orjson.dumps(geo_json)
+        for scope in [sample_state, "All India"]:
+            payload = level_store[scope]
+            scope_districts = district_geo_dict[scope]
+            start = time.perf_counter()
+            for _ in range(repeat):
+                # geometry embedded, as before the /geo route
+                update_cm_fig(
+                    px.choropleth(
+                        scope_districts.assign(value=0.0),
+                        geojson=orjson.loads(payload),
+                        featureidkey="properties.707_dist_7",
+                        locations="District_geo",
+                        color="value",
+                        projection="mercator",
+                    )
+                ).to_json()
+            figure_ms = (time.perf_counter() - start) / repeat * 1000
+            print(
+                f"{level:<7} {scope:<12} {len(payload) / 2**10:11.0f} "
+                f"{len(gzip.compress(payload)) / 2**10:10.0f} {figure_ms:16.0f}"
+            )
+        state_sizes = [
+            len(payload)
+            for scope, payload in level_store.items()
+            if scope != "All India"
         ]
-    elif disagg_value == "Caste":
-        col_map = ["SC", "ST", "OBC", "Others"]
-    else:
-        col_map = ["Hindu", "Muslim", "Other"]
+        state_kib = np.mean(state_sizes) / 2**10
+        print(f"{level:<7} {'state mean':<12} {state_kib:11.0f}")
 
-    display_df = df_equity.query(
-        "State == @state_value & Year == 'NFHS-4 (2015-16)'"
-    ).melt(
-        id_vars=["Indicator", "State"],
-        value_vars=col_map,
-    )
 
-    display_df_2 = df_equity.query(
-        "State == @state_value & Year == 'NFHS-5 (2019-21)'"
-    ).melt(
-        id_vars=["Indicator", "State"],
-        value_vars=col_map,
+# %%
+# cache warm-up: pre-render every map input before serving traffic
+warmup_workers = int(os.environ.get("NFHS_WARMUP_WORKERS", os.cpu_count() or 1))
+
+
+def warmup_items():
+    scopes = [option["value"] for option in india_or_state_options]
+    return [("map", (scope, kpi)) for scope in scopes for kpi in district_kpi_map]
+
+
+def render_warmup_item(item):
+    # runs in a forked worker: only the serialized bytes go back to the parent
+    callback_name, args = item
+    start = time.perf_counter()
+    content = serialize_output(cached_callbacks[callback_name](*args))
+    return content, time.perf_counter() - start
+
+
+def warm_up_figure_cache():
+    start = time.perf_counter()
+    items = warmup_items()
+    pending = []
+    for callback_name, args in items:
+        key = orjson.dumps([callback_name, args])
+        content = shared_cache_get(key)
+        if content is None:
+            pending.append((key, (callback_name, args)))
+        else:
+            figure_cache_put(key, content)
+    if "fork" in mp.get_all_start_methods():
+        executor = ProcessPoolExecutor(
+            max_workers=warmup_workers, mp_context=mp.get_context("fork")
+        )
+    else:
+        executor = ThreadPoolExecutor(max_workers=warmup_workers)
+    with executor:
+        results = executor.map(
+            render_warmup_item,
+            [item for _, item in pending],
+            chunksize=max(1, len(pending) // (warmup_workers * 8)),
+        )
+        durations = []
+        for (key, _), (content, seconds) in zip(pending, results):
+            shared_cache_put(key, content)
+            figure_cache_put(key, content)
+            durations.append(seconds * 1000)
+    wall = time.perf_counter() - start
+    print(
+        f"warm-up: {len(pending)} rendered, "
+        f"{len(items) - len(pending)} already cached, "
+        f"{warmup_workers} workers, {wall:.1f} s"
     )
+    if durations:
+        p50, p90, p99 = np.percentile(durations, [50, 90, 99])
+        print(
+            f"warm-up per item ms: p50 {p50:.0f}  p90 {p90:.0f}  p99 {p99:.0f}  "
+            f"max {max(durations):.0f}"
+        )
 
-    fig = px.bar(
-        display_df,
-        x="Indicator",
-        y="value",
-        color="variable",
-        barmode="group",
-        title="NFHS-4 (2015-16)",
-    ).update_yaxes(range=[0, 100])
-
-    fig_2 = px.bar(
-        display_df_2,
-        x="Indicator",
-        y="value",
-        color="variable",
-        barmode="group",
-        title="NFHS-5 (2019-21)",
-    ).update_yaxes(range=[0, 100])
-
-    return fig, fig_2
 
 # %%
 # Run app and print out the application URL
 if __name__ == "__main__":
-    app.run_server(debug=True)
+    if cli_command == "build-snapshot":
+        print(f"NFHS snapshot written to {snapshot_dir}")
+    elif cli_command == "bench-geo":
+        benchmark_geo_levels()
+    elif cli_command == "warmup":
+        warm_up_figure_cache()
+    else:
+        app.run_server(debug=True)
@@ -0,0 +1,23 @@
+# gunicorn settings, read from the working directory (see Procfile)
+import gc
+import os
+
+# master builds the data once, workers are forked with it already loaded
+preload_app = os.environ.get("NFHS_PRELOAD", "1") == "1"
+# tables as memory-mapped arrow files shared by all workers
+os.environ.setdefault("NFHS_SHARED_MEMORY", "1")
+
+
+def when_ready(server):
+    # master, before forking workers: keep preloaded objects out of gc passes
+    # so collections in the workers don't write to (and copy) shared pages
+    gc.freeze()
+
+
+def on_starting(server):
+    # NFHS_WARMUP=1: fill the figure caches before the port opens (with preload
+    # the app is already imported here and workers inherit the filled cache)
+    if os.environ.get("NFHS_WARMUP", "0") == "1":
+        import dash_nfhs
+
+        dash_nfhs.warm_up_figure_cache()